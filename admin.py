@@ -58,3 +58,10 @@ class ProviderAdmin(admin.ModelAdmin):
                     'phone_number', 'phone_number_extra', 'email',
                     'is_active', 'is_staff')
     search_fields = ['username', 'first_name', 'last_name', 'email']
+
+    def queryset(self, request):
+        # first_access column: no query per row
+        return super(ProviderAdmin, self).queryset(request) \
+                                         .select_related('user') \
+                                         .prefetch_related('access__role',
+                                                           'access__target')
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+import csv
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bolibana.tools.entities import import_entities
+
+
+class Command(BaseCommand):
+
+    args = u"<entities.csv|entities.json>"
+    help = u"Creates or updates Entities from a CSV or JSON file " \
+           u"with slug, name, type, parent and phone_number columns"
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError(u"Usage: import_entities %s" % self.args)
+        path = args[0]
+
+        with open(path, 'rb') as f:
+            if path.lower().endswith('.json'):
+                rows = json.load(f)
+            else:
+                rows = []
+                reader = csv.DictReader(f)
+                for row in reader:
+                    # DictReader fills short rows with None and keys
+                    # extra values with None
+                    if None in row or None in row.values():
+                        raise CommandError(u"Line %d: expected %d columns"
+                                           % (reader.line_num,
+                                              len(reader.fieldnames)))
+                    rows.append(dict((key, value.decode('utf-8'))
+                                     for key, value in row.items()))
+
+        try:
+            result = import_entities(rows)
+        except (KeyError, ValueError) as e:
+            raise CommandError(e)
+
+        self.stdout.write(u"%(created)d created, %(updated)d updated, "
+                          u"%(moved)d moved.\n" % result)
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.core.management.base import BaseCommand
+
+from bolibana.models import PeriodHierarchy
+
+
+class Command(BaseCommand):
+
+    help = u"Regenerates the period hierarchy (day to year rollups)"
+
+    def handle(self, *args, **options):
+        count = PeriodHierarchy.rebuild()
+        self.stdout.write(u"%d period links created.\n" % count)
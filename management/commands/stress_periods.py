@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+import random
+import threading
+from datetime import date, timedelta
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from bolibana.models import Period
+from bolibana.models.PeriodKey import PeriodKey
+
+
+class Command(BaseCommand):
+
+    help = u"Checks Period.create_or_get() under concurrency: many threads " \
+           u"request the same new period at once. Exactly one row must exist."
+
+    option_list = BaseCommand.option_list + (
+        make_option('--threads', type='int', dest='threads', default=20,
+                    help=u"Concurrent requests per round"),
+        make_option('--rounds', type='int', dest='rounds', default=10,
+                    help=u"Number of new periods requested"),
+        make_option('--get-or-create', action='store_true',
+                    dest='get_or_create', default=False,
+                    help=u"Use the get_or_create() path (PostgreSQL & co.) "
+                         u"whatever the database vendor"),
+    )
+
+    def handle(self, *args, **options):
+        if options['get_or_create']:
+            def request(key):
+                return Period.objects.get_or_create(
+                    start_on=key.start_on, end_on=key.end_on,
+                    period_type=key.period_type)[0]
+        else:
+            def request(key):
+                return Period.create_or_get(key.start_on, key.end_on,
+                                            key.period_type)
+
+        failures = 0
+        for index in range(options['rounds']):
+            # a day no one uses, far in the future
+            day = date(2200, 1, 1) + timedelta(random.randint(0, 100000))
+            key = PeriodKey.for_date(Period.DAY, day)
+            if Period.objects.filter(start_on=key.start_on,
+                                     end_on=key.end_on,
+                                     period_type=key.period_type).exists():
+                continue
+
+            start = threading.Event()
+            ids = []
+            errors = []
+
+            def worker():
+                start.wait()
+                try:
+                    ids.append(request(key).id)
+                except Exception as e:
+                    errors.append(e)
+                finally:
+                    # one connection per thread
+                    connection.close()
+
+            threads = [threading.Thread(target=worker)
+                       for i in range(options['threads'])]
+            for thread in threads:
+                thread.start()
+            start.set()
+            for thread in threads:
+                thread.join()
+
+            rows = Period.objects.filter(start_on=key.start_on,
+                                         end_on=key.end_on,
+                                         period_type=key.period_type)
+            count = rows.count()
+            ok = count == 1 and not errors and len(set(ids)) == 1
+            failures += not ok
+            self.stdout.write(u"%(day)s: %(rows)d row(s), %(ids)d id(s), "
+                              u"%(errors)d error(s)%(status)s\n"
+                              % {'day': day, 'rows': count,
+                                 'ids': len(set(ids)), 'errors': len(errors),
+                                 'status': u"" if ok else u" FAILED"})
+            for error in errors[:3]:
+                self.stdout.write(u"    %r\n" % error)
+            rows.delete()
+
+        if failures:
+            raise CommandError(u"%d round(s) failed." % failures)
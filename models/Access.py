@@ -3,6 +3,8 @@
 # maintainer: rgaudin
 
 from django.db import models
+from django.db.models import Q
+from django.db.models.query import prefetch_related_objects
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils.translation import ugettext_lazy as _, ugettext
 from django.contrib.contenttypes.models import ContentType
@@ -10,6 +12,16 @@ from django.contrib.contenttypes import generic
 
 from django.contrib.auth.models import ContentType
 
+from bolibana.tools.db import (bulk_insert, batches, BULK_BATCH_SIZE,
+                               MAX_VARIABLES)
+
+
+class AccessManager(models.Manager):
+
+    def with_targets(self):
+        """ role joined and targets prefetched: one query per target type """
+        return self.select_related('role').prefetch_related('target')
+
 
 class Access(models.Model):
     """ Bundle of a Role for a target object. Usually an Entity.
@@ -29,6 +41,8 @@ class Access(models.Model):
     object_id = models.PositiveIntegerField()
     target = generic.GenericForeignKey('content_type', 'object_id')
 
+    objects = AccessManager()
+
     def __unicode__(self):
         return self.name()
 
@@ -48,6 +62,13 @@ class Access(models.Model):
         oi = target.id
         return (ct, oi)
 
+    @classmethod
+    def prefetch_targets(cls, accesses):
+        """ resolves targets of many accesses. One query per content type """
+        accesses = list(accesses)
+        prefetch_related_objects(accesses, ['target'])
+        return accesses
+
     @classmethod
     def find_by(cls, role, target):
         ct, oi = cls.target_data(target)
@@ -57,3 +78,64 @@ class Access(models.Model):
             access = cls(role=role, content_type=ct, object_id=oi)
             access.save()
             return access
+
+    @classmethod
+    def find_by_many(cls, pairs):
+        """ {(role, target): Access} for many pairs. Missing ones created
+
+            One query for existing ones, bulk inserts of missing ones
+            then one refetch of those. role can be a Role or its slug. """
+        keys = {}
+        for role, target in pairs:
+            ct, oi = cls.target_data(target)
+            keys[(role, target)] = (getattr(role, 'pk', role), ct.id, oi)
+
+        found = cls.fetch_keys(set(keys.values()))
+        missing = set(keys.values()) - set(found.keys())
+        if missing:
+            accesses = [cls(role_id=role_id, content_type_id=ct_id,
+                            object_id=oi)
+                        for role_id, ct_id, oi in missing]
+            # if some were created concurrently, others are created
+            # one by one below
+            bulk_insert(cls, accesses)
+            found.update(cls.fetch_keys(missing))
+            for role_id, ct_id, oi in missing - set(found.keys()):
+                found[(role_id, ct_id, oi)] = cls.objects.get_or_create(
+                    role_id=role_id, content_type_id=ct_id, object_id=oi)[0]
+
+        return dict((pair, found[key]) for pair, key in keys.items())
+
+    @classmethod
+    def fetch_keys(cls, keys):
+        """ {(role_id, content_type_id, object_id): Access} of existing ones
+
+            Single query unless keys exceed SQLite's variables limit. """
+        grouped = {}
+        for role_id, ct_id, oi in keys:
+            grouped.setdefault((role_id, ct_id), []).append(oi)
+
+        # (number of variables, condition) per (role, content_type) chunk
+        conditions = []
+        for (role_id, ct_id), object_ids in grouped.items():
+            for chunk in batches(object_ids, BULK_BATCH_SIZE):
+                conditions.append((len(chunk) + 2,
+                                   Q(role=role_id, content_type=ct_id,
+                                     object_id__in=chunk)))
+
+        queries = []
+        size = 0
+        for variables, condition in conditions:
+            if queries and size + variables <= MAX_VARIABLES:
+                queries[-1] |= condition
+                size += variables
+            else:
+                queries.append(condition)
+                size = variables
+
+        found = {}
+        for query in queries:
+            for access in cls.objects.filter(query):
+                found[(access.role_id, access.content_type_id,
+                       access.object_id)] = access
+        return found
@@ -2,13 +2,29 @@
 # encoding=utf-8
 # maintainer: rgaudin
 
+import threading
+
 from django.db import models
 from django.dispatch import receiver
-from django.db.models.signals import pre_save
+from django.db.models.signals import pre_save, post_save, post_delete
 from django.utils.translation import ugettext_lazy as _, ugettext
 from mptt.models import MPTTModel, TreeForeignKey
 from mptt.managers import TreeManager
 
+from bolibana.tools.caching import get_versions, bump_versions
+
+# mptt's node_moved signal is only available in recent versions
+try:
+    from mptt.signals import node_moved
+except ImportError:
+    node_moved = None
+
+GENERATION_KEY = 'bolibana_entity_generation'
+# in-process part of the generation. see tree_generation()
+_local_generation = [0]
+# generation read once per request or batch. see PinnedTreeGeneration
+_pinned = threading.local()
+
 
 class Entity(MPTTModel):
 
@@ -58,3 +74,68 @@ def pre_save_entity(sender, instance, **kwargs):
     """ mark phone_number as None is not filled """
     if instance.phone_number == u'':
         instance.phone_number = None
+
+
+def tree_generation():
+    """ version of the Entity tree. Changes on any Entity save/delete/move
+
+        Shared between processes through the default cache. The local
+        part ensures in-process invalidation even with a dummy cache.
+        Within PinnedTreeGeneration, the cache is read once. """
+    generation = getattr(_pinned, 'generation', None)
+    if generation is not None:
+        return generation
+    shared = get_versions([GENERATION_KEY])[GENERATION_KEY]
+    generation = u"%s.%d" % (shared, _local_generation[0])
+    if getattr(_pinned, 'depth', 0):
+        _pinned.generation = generation
+    return generation
+
+
+def bump_tree_generation():
+    """ invalidates every cache keyed on tree_generation() """
+    _local_generation[0] += 1
+    # our own changes are seen right away, even when pinned
+    _pinned.generation = None
+    bump_versions([GENERATION_KEY])
+
+
+class PinnedTreeGeneration(object):
+    """ reads tree_generation() once for a request or batch of lookups
+
+        Changes made by other threads or processes meanwhile are seen
+        when leaving. Nestable. Use as a context manager or through
+        pin() and unpin(). see web.middleware.EntityTreeMiddleware """
+
+    def pin(self):
+        _pinned.depth = getattr(_pinned, 'depth', 0) + 1
+
+    def unpin(self):
+        _pinned.depth = max(getattr(_pinned, 'depth', 0) - 1, 0)
+        if not _pinned.depth:
+            _pinned.generation = None
+
+    def reset(self):
+        """ unpins completely: a thread starting a new request """
+        _pinned.depth = 0
+        _pinned.generation = None
+
+    def __enter__(self):
+        self.pin()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.unpin()
+
+pinned_tree_generation = PinnedTreeGeneration()
+
+
+@receiver(post_save, sender=Entity)
+@receiver(post_delete, sender=Entity)
+def entity_changed(sender, instance, **kwargs):
+    """ an Entity changed: bump tree generation """
+    bump_tree_generation()
+
+if node_moved is not None:
+    node_moved.connect(entity_changed, sender=Entity,
+                       dispatch_uid='bolibana_entity_moved')
@@ -5,6 +5,8 @@
 from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
+from Report import VisibilityManager
+
 SOURCE_LEVEL = 1
 AGGREGATED_LEVEL = 2
 REPORTING_LEVELS = ((SOURCE_LEVEL, _(u"Source")),
@@ -25,6 +27,8 @@ class ExpectedReporting(models.Model):
     level = models.PositiveIntegerField(choices=REPORTING_LEVELS,
                                         verbose_name=_(u"Reporting Level"))
 
+    objects = VisibilityManager()
+
     def __unicode__(self):
         return (u"%(entity)s/%(report_class)s:%(level)s"
                 % {'entity': self.entity,
@@ -2,17 +2,74 @@
 # encoding=utf-8
 # maintainer: rgaudin
 
+from bisect import bisect_right
+from copy import copy
 from datetime import datetime, date, timedelta
-
-from django.db import models
+from functools import wraps
+from numbers import Integral
+
+from django.conf import settings
+from django.db import models, transaction, router, connections
+from django.db.models import Q
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver, Signal
 from django.utils import timezone
-from django.utils.translation import ugettext_lazy as _, ugettext
+from django.utils.translation import ugettext_lazy as _, ugettext, get_language
 
 from bolibana.tools.utils import normalize_date
+from bolibana.tools.caching import LRUCache
+from bolibana.tools.db import bulk_insert
+from bolibana.models.PeriodKey import (PeriodKey, period_ordinal,
+                                       epoch_microseconds)
 from bolibana.reporting.utils import next_month
 
 ONE_SECOND = 0.0001
 ONE_MICROSECOND = 0.00000000001
+DEFAULT_PERIOD_CACHE_SIZE = 5000
+
+# vendor -> insert statement skipping rows violating unique_together
+INSERT_IGNORE = {
+    'sqlite': u"INSERT OR IGNORE INTO %(table)s (%(columns)s) VALUES (%(values)s)",
+    'mysql': u"INSERT IGNORE INTO %(table)s (%(columns)s) VALUES (%(values)s)",
+}
+
+# NumPy is optional. Only used to speed up Period.bucketize()
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+# sent with the list of periods inserted by Period.from_keys() (no post_save)
+periods_created = Signal(providing_args=['periods'])
+
+# period_type -> proxy class. See register_period()
+PERIOD_CLASSES = {}
+
+# (method, class, period, language) -> name()/full_name() output
+name_cache = LRUCache(DEFAULT_PERIOD_CACHE_SIZE)
+
+
+def register_period(cls):
+    ''' class decorator registering a Period proxy for its type()
+
+    Registered classes are used to recast base Period instances. '''
+    PERIOD_CLASSES[cls.type()] = cls
+    return cls
+
+
+def localized_cache(method):
+    ''' caches a naming method per period, class and active language '''
+    @wraps(method)
+    def wrapper(self):
+        key = (method.__name__, self.__class__, self.sort_key(),
+               get_language())
+        value = name_cache.get(key)
+        if value is None:
+            value = method(self)
+            name_cache.set(key, value)
+        return value
+    return wrapper
 
 
 class DayManager(models.Manager):
@@ -69,6 +126,8 @@ class Period(models.Model):
     class Meta:
         app_label = 'bolibana'
         unique_together = ('start_on', 'end_on', 'period_type')
+        # migration 0005 adds an index on (period_type, start_on, end_on)
+        # for containment lookups. See Period.containing()
         verbose_name = _(u"Period")
         verbose_name_plural = _(u"Periods")
 
@@ -106,43 +165,76 @@ class Period(models.Model):
     customs = CustomManager()
     django = models.Manager()
 
+    # comparisons, hashing and sorting rely on integers computed once.
+    # see ordinal and sort_key()
+
     def __lt__(self, other):
         try:
-            return self.end_on < self.normalize_date(other.start_on)
-        except:
+            return self.sort_key() < other.sort_key()
+        except AttributeError:
             return NotImplemented
 
     def __le__(self, other):
         try:
-            return self.end_on <= self.normalize_date(other.end_on)
-        except:
+            return self.sort_key() <= other.sort_key()
+        except AttributeError:
             return NotImplemented
 
     def __eq__(self, other):
         try:
-            return self.pid == other.pid
-        except:
+            return self.sort_key() == other.sort_key()
+        except AttributeError:
             return NotImplemented
 
     def __ne__(self, other):
         try:
-            return self.start_on != self.normalize_date(other.start_on) \
-                or self.end_on != self.normalize_date(other.end_on)
-        except:
+            return self.sort_key() != other.sort_key()
+        except AttributeError:
             return NotImplemented
 
     def __gt__(self, other):
         try:
-            return self.start_on > self.normalize_date(other.end_on)
-        except:
+            return self.sort_key() > other.sort_key()
+        except AttributeError:
             return NotImplemented
 
     def __ge__(self, other):
         try:
-            return self.start_on >= self.normalize_date(other.start_on)
-        except:
+            return self.sort_key() >= other.sort_key()
+        except AttributeError:
             return NotImplemented
 
+    def __hash__(self):
+        return hash(self.ordinal)
+
+    def memo(self):
+        ''' per-instance dict of computed values.
+
+        Reset whenever class, boundaries or type change. '''
+        bounds = (self.__class__, self.start_on, self.end_on, self.period_type)
+        if self.__dict__.get('_memo_bounds') != bounds:
+            self._memo_bounds = bounds
+            self._memo = {}
+        return self._memo
+
+    @property
+    def ordinal(self):
+        ''' sortable int: UTC epoch (microseconds) of start_on + type rank '''
+        memo = self.memo()
+        if 'ordinal' not in memo:
+            memo['ordinal'] = None if self.start_on is None \
+                else period_ordinal(self.period_type, self.start_on)
+        return memo['ordinal']
+
+    def sort_key(self):
+        ''' (ordinal, end_on epoch) integers tuple '''
+        memo = self.memo()
+        if 'sort_key' not in memo:
+            memo['sort_key'] = (self.ordinal,
+                                None if self.end_on is None
+                                else epoch_microseconds(self.end_on))
+        return memo['sort_key']
+
     def normalize_date(self, obj):
         return normalize_date(obj, as_aware=self.is_aware())
 
@@ -156,16 +248,16 @@ class Period(models.Model):
     def is_naive(self):
         return not self.is_aware()
 
-    def list_of_subs(self, cls):
+    def list_of_subs(self, cls, create=True):
+        ''' cls periods overlapping this one.
+
+        Boundaries are computed in memory and rows fetched in one query.
+        Missing ones are bulk created unless create is False in which
+        case unsaved instances are returned for them. '''
         if cls == self.__class__:
             return [self]
-        d = []
-        n = cls.find_create_by_date(self.start_on, dont_create=True)
-        while n.start_on <= self.end_on:
-            d.append(n)
-            n = cls.find_create_by_date(n.start_on + timedelta(cls.delta()),
-                                        dont_create=True)
-        return d
+        return cls.from_keys(cls.keys_between(self.start_on, self.end_on),
+                             create=create)
 
     def cast(self, cls):
         self.__class__ = cls
@@ -207,26 +299,47 @@ class Period(models.Model):
     @property
     def pid(self):
         ''' A locale safe identifier of the period '''
-        return self.middle().strftime('%s')
+        return self.epoch_id()
+
+    def epoch_id(self):
+        ''' UTC epoch (seconds) of middle() as a string '''
+        memo = self.memo()
+        if 'epoch_id' not in memo:
+            memo['epoch_id'] = str(epoch_microseconds(self.middle()) // 1000000)
+        return memo['epoch_id']
 
     def middle(self):
         ''' datetime at half of the period duration '''
-        return self.start_on + ((self.end_on - self.start_on) / 2)
+        memo = self.memo()
+        if 'middle' not in memo:
+            memo['middle'] = self.start_on \
+                + ((self.end_on - self.start_on) / 2)
+        return memo['middle']
 
     def __unicode__(self):
         return self.name().decode('utf-8')
 
+    def typed(self):
+        ''' this period as its registered period_type class. No query '''
+        cls = PERIOD_CLASSES.get(self.period_type)
+        if cls is None or self.__class__ is cls:
+            return self
+        period = copy(self)
+        period.cast(cls)
+        return period
+
+    @localized_cache
     def name(self):
-        try:
-            cls = eval(u"%sPeriod" % self.period_type.title())
-            return cls.objects.get(id=self.id).name()
-        except:
-            # TRANSLATORS: Python date format for Generic .name()
-            return self.middle().strftime(ugettext('%c'))
+        typed = self.typed()
+        if typed is not self:
+            return typed.name()
+        # TRANSLATORS: Python date format for Generic .name()
+        return self.middle().strftime(ugettext('%c'))
 
     def strid(self):
-        return self.middle().strftime('%s')
+        return self.epoch_id()
 
+    @localized_cache
     def full_name(self):
         return self.name()
 
@@ -240,6 +353,21 @@ class Period(models.Model):
         return self.find_create_by_date(self.middle()
                                         - timedelta(self.delta()))
 
+    @property
+    def key(self):
+        ''' PeriodKey of this period. Calendar math without queries '''
+        return PeriodKey(self.period_type, self.start_on, self.end_on)
+
+    @classmethod
+    def key_for(cls, date_obj):
+        ''' PeriodKey of the period including date_obj. No query '''
+        return PeriodKey.for_date(cls.type(), date_obj)
+
+    @classmethod
+    def keys_between(cls, start, end):
+        ''' ordered PeriodKey list covering start to end. No query '''
+        return PeriodKey.span(cls.type(), start, end)
+
     @classmethod
     def boundaries(cls, date_obj):
         ''' start and end dates of a period from a date. '''
@@ -254,17 +382,63 @@ class Period(models.Model):
          * datetime instance
          * date instance
          * integer (year) '''
-
+        if isinstance(date_obj, Integral):
+            # year overlaps the period
+            return self.start_on.year <= date_obj <= self.end_on.year
+        if not isinstance(date_obj, date):
+            raise ValueError("Can not understand date object.")
+        if not isinstance(date_obj, datetime):
+            date_obj = datetime(date_obj.year, date_obj.month,
+                                date_obj.day, 12, 0)
         date_obj = self.normalize_date(date_obj)
-        if isinstance(date, date_obj):
-            date_obj = datetime(date.year, date.month, date.day, 12, 0)
-        if isinstance(datetime, date_obj):
-            return self.start_on < date_obj and self.end_on > date_obj
-        elif isinstance(int, date_obj):
-            pass
-        return False
-        # not sure what to do??
-        raise ValueError("Can not understand date object.")
+        return self.start_on <= date_obj <= self.end_on
+
+    @classmethod
+    def bucketize(cls, timestamps, as_keys=False, create=False):
+        ''' period of each timestamp, as id or PeriodKey if as_keys.
+
+        timestamps is a sequence of datetime (naive ones are UTC) or a
+        NumPy datetime64 array. Period boundaries are computed once then
+        each timestamp is located by binary search (NumPy's searchsorted
+        for arrays). Returned list is aligned with timestamps.
+        Ids are None for periods not in DB unless create is True. '''
+
+        is_array = numpy is not None and isinstance(timestamps, numpy.ndarray)
+        if not is_array:
+            timestamps = list(timestamps)
+        if not len(timestamps):
+            return []
+
+        if is_array:
+            timestamps = timestamps.astype('datetime64[us]')
+            first = timestamps.min().astype(datetime)
+            last = timestamps.max().astype(datetime)
+        else:
+            first, last = min(timestamps), max(timestamps)
+
+        keys = cls.keys_between(first, last)
+
+        # compare in timestamps' own flavor (naive or aware)
+        if timezone.is_aware(first):
+            starts = [key.start_on for key in keys]
+        else:
+            starts = [timezone.make_naive(key.start_on, timezone.utc)
+                      for key in keys]
+
+        # converting a list to an array costs more than bisecting it
+        if is_array:
+            indexes = (numpy.searchsorted(numpy.array(starts,
+                                                      dtype='datetime64[us]'),
+                                          timestamps, side='right') - 1) \
+                .tolist()
+        else:
+            indexes = [bisect_right(starts, ts) - 1 for ts in timestamps]
+
+        if as_keys:
+            return [keys[index] for index in indexes]
+
+        ids = [period.id for period in cls.from_keys(keys, create=create)]
+        return [ids[index] for index in indexes]
 
     @classmethod
     def find_create_from(cls, year, month=None, day=None,
@@ -275,11 +449,16 @@ class Period(models.Model):
             # assume year search
             sy = datetime(year, 1, 1, 0, 0, tzinfo=timezone.utc)
             ey = sy.replace(year=year + 1) - timedelta(ONE_MICROSECOND)
+            period = period_cache.lookup(cls, cls.type(), sy, ey)
+            if period is not None:
+                return period
             try:
                 period = cls.objects.filter(start_on__lte=sy,
                                             end_on__gte=ey)[0]
             except IndexError:
                 period = cls.find_create_with(sy, ey)
+            else:
+                period_cache.add(period)
             return period
 
         if week:
@@ -299,6 +478,15 @@ class Period(models.Model):
 
         return period
 
+    @classmethod
+    def containing(cls, date_obj):
+        ''' QuerySet of periods including date_obj. Latest start first.
+
+        Served by the (period_type, start_on, end_on) index. '''
+        date_obj = normalize_date(date_obj, as_aware=True)
+        return cls.objects.filter(start_on__lte=date_obj,
+                                  end_on__gte=date_obj).order_by('-start_on')
+
     @classmethod
     def find_create_by_date(cls, date_obj, dont_create=False):
         ''' creates a period to fit the provided date in '''
@@ -310,16 +498,21 @@ class Period(models.Model):
                                 tzinfo=timezone.utc)
 
         date_obj = normalize_date(date_obj, as_aware=True)
+
+        # typed periods have predictable boundaries: try the identity map
+        if period_cache.handles(cls):
+            period = period_cache.lookup(cls, cls.type(),
+                                         *cls.boundaries(date_obj))
+            if period is not None:
+                return period
+
         try:
-            period = [period for period in cls.objects.all()
-                      if period.start_on <= date_obj
-                      and period.end_on >= date_obj][0]
+            period = cls.containing(date_obj)[0]
         except IndexError:
-
+            # saved (and cached) already: another save would evict it
             period = cls.find_create_with(*cls.boundaries(date_obj))
-            if dont_create:
-                return period
-            period.save()
+        else:
+            period_cache.add(period)
         return period
 
     @classmethod
@@ -329,56 +522,173 @@ class Period(models.Model):
         end_on = normalize_date(end_on, as_aware=True)
         if not period_type:
             period_type = cls.type()
+        period = period_cache.lookup(cls, period_type, start_on, end_on)
+        if period is not None:
+            return period
         try:
             period = cls.objects.get(start_on=start_on,
                                      end_on=end_on, period_type=period_type)
         except cls.DoesNotExist:
-            period = cls(start_on=start_on, end_on=end_on,
-                         period_type=period_type)
-            period.save()
+            period = cls.create_or_get(start_on, end_on, period_type)
+        period_cache.add(period)
         return period
 
     @classmethod
-    def find_create_by_weeknum(cls, year, weeknum, is_iso=False):
+    def create_or_get(cls, start_on, end_on, period_type):
+        ''' period row for those boundaries. Safe under concurrent creation.
+
+        Relies on unique_together: INSERT OR IGNORE on SQLite, INSERT IGNORE
+        on MySQL, get_or_create()'s savepoint and retry elsewhere. '''
+        using = router.db_for_write(Period)
+        connection = connections[using]
+        lookup = {'start_on': start_on, 'end_on': end_on,
+                  'period_type': period_type}
+
+        if connection.vendor not in INSERT_IGNORE:
+            return cls.objects.using(using).get_or_create(**lookup)[0]
+
+        qn = connection.ops.quote_name
+        fields = [Period._meta.get_field(name)
+                  for name in ('start_on', 'end_on', 'period_type')]
+        sql = INSERT_IGNORE[connection.vendor] \
+            % {'table': qn(Period._meta.db_table),
+               'columns': u", ".join([qn(f.column) for f in fields]),
+               'values': u", ".join([u"%s"] * len(fields))}
+        params = [f.get_db_prep_save(lookup[f.name], connection=connection)
+                  for f in fields]
+        cursor = connection.cursor()
+        cursor.execute(sql, params)
+        created = cursor.rowcount == 1
+        transaction.commit_unless_managed(using=using)
+
+        period = cls.objects.using(using).get(**lookup)
+        if created:
+            # raw insert sent no post_save
+            periods_created.send(sender=cls, periods=[period])
+        return period
 
-        # version 1
-        # sw, ew = week_from_weeknum(year, week, is_iso=is_iso)
-        # period = cls.find_create_with(sw, ew)
-        # return period
+    @classmethod
+    def range_types(cls):
+        ''' period types generated by ensure_range() for this class '''
+        if cls.type() in PERIOD_CLASSES:
+            return [cls.type()]
+        return [cls.DAY, cls.WEEK, cls.MONTH, cls.QUARTER, cls.YEAR]
 
-        # version 2
-        # soy = date(year, 1, 1)
-        # d = soy + timedelta(WeekPeriod.delta() * weeknum)
-        # return cls.find_create_by_date(d)
+    @classmethod
+    def ensure_range(cls, start, end):
+        ''' all periods covering start to end, creating missing ones.
+
+        Called on a proxy class, only its type is considered.
+        On Period, all of Day, Week, Month, Quarter and Year are.
+        Boundaries are computed in memory and missing rows are inserted
+        with bulk_create. Returns the list ordered by start_on. '''
+        keys = []
+        for period_type in cls.range_types():
+            keys.extend(PeriodKey.span(period_type, start, end))
+        return cls.from_keys(keys, create=True)
 
-        sy = datetime(year, 1, 1, 0, 0, tzinfo=timezone.utc)
-        # ey = datetime(year, 12, 31, 23, 59)
-        ONE_WEEK = WeekPeriod.delta()
+    @classmethod
+    def from_keys(cls, keys, create=False):
+        ''' typed Period instances for a list of PeriodKey. One query.
+
+        Keys without an exact match reuse an existing row including their
+        start (one more query) like find_create_by_date() would.
+        Missing rows are bulk created if create is True.
+        Otherwise, unsaved instances are returned in their place. '''
+        keys = sorted(set(keys))
+        if not keys:
+            return []
+
+        periods = cls._fetch_keys(keys)
+        missing = [key for key in keys if key not in periods]
+        if missing:
+            # rows with other boundaries (find_create_by_weeknum) still count
+            periods.update(cls._fetch_containing(missing))
+            missing = [key for key in keys if key not in periods]
+        if create and missing:
+            cls._bulk_create_keys(missing)
+            periods.update(cls._fetch_keys(missing))
+            periods_created.send(sender=cls,
+                                 periods=[periods[key] for key in missing
+                                          if key in periods])
+
+        for period in periods.values():
+            period_cache.add(period)
+        return [periods[key] if key in periods else key.as_period()
+                for key in keys]
 
-        # retrieve start of year day
-        sy_dow = sy.isoweekday() if is_iso else sy.weekday()
+    @classmethod
+    def _fetch_keys(cls, keys):
+        ''' {key: period} of existing rows for keys. Single range query '''
+        bounds = {}
+        for key in keys:
+            start, end = bounds.get(key.period_type, (key.start_on, key.end_on))
+            bounds[key.period_type] = (min(start, key.start_on),
+                                       max(end, key.end_on))
+        query = Q()
+        for period_type, (start, end) in bounds.items():
+            query |= Q(period_type=period_type,
+                       start_on__gte=start, end_on__lte=end)
+        wanted = set(keys)
+        periods = {}
+        for period in Period.objects.filter(query):
+            period.cast(PERIOD_CLASSES.get(period.period_type, Period))
+            if period.key in wanted:
+                periods[period.key] = period
+        return periods
 
-        # find first real week (first Mon/Sun)
-        if sy_dow != 0:
-            sy = sy + timedelta(ONE_WEEK - sy_dow)
+    @classmethod
+    def _fetch_containing(cls, keys):
+        ''' {key: period} of existing rows including keys' start. One query '''
+        bounds = {}
+        for key in keys:
+            first, last = bounds.get(key.period_type,
+                                     (key.start_on, key.start_on))
+            bounds[key.period_type] = (min(first, key.start_on),
+                                       max(last, key.start_on))
+        query = Q()
+        for period_type, (first, last) in bounds.items():
+            query |= Q(period_type=period_type,
+                       start_on__lte=last, end_on__gte=first)
+        by_type = {}
+        for period in Period.objects.filter(query).order_by('start_on'):
+            period.cast(PERIOD_CLASSES.get(period.period_type, Period))
+            by_type.setdefault(period.period_type, []).append(period)
+        starts = dict((period_type, [p.start_on for p in group])
+                      for period_type, group in by_type.items())
+
+        periods = {}
+        for key in keys:
+            if key.period_type not in by_type:
+                continue
+            # latest row starting before key, as containing() would
+            index = bisect_right(starts[key.period_type], key.start_on) - 1
+            if index < 0:
+                continue
+            period = by_type[key.period_type][index]
+            if period.end_on >= key.start_on:
+                periods[key] = period
+        return periods
 
-        # if we want first week, it's from Jan 1st to next Mon/Sun
-        if weeknum == 0:
-            start_week = sy
-            end_week = start_week + timedelta(ONE_WEEK - sy_dow) \
-                - timedelta(ONE_SECOND)
-        else:
-            weeknum -= 1  # cause we've set start as first real week
-            start_week = sy + timedelta(ONE_WEEK * weeknum)
-            end_week = start_week + timedelta(ONE_WEEK) - timedelta(ONE_SECOND)
+    @classmethod
+    def _bulk_create_keys(cls, keys):
+        ''' inserts rows for keys known to be missing '''
+        rows = [Period(start_on=key.start_on, end_on=key.end_on,
+                       period_type=key.period_type) for key in keys]
+        if not bulk_insert(Period, rows):
+            # rows created concurrently since we looked. go one by one.
+            for key in keys:
+                key.materialize()
 
-        period = cls.find_create_with(start_week, end_week)
-        return period
+    @classmethod
+    def find_create_by_weeknum(cls, year, weeknum, is_iso=False):
+        key = PeriodKey.for_weeknum(cls.type(), year, weeknum, is_iso=is_iso)
+        return cls.find_create_with(key.start_on, key.end_on)
 
     @classmethod
     def find_create_by_quarter(cls, year, quarter):
-        return YearPeriod.find_create_from(year, dont_create=True) \
-                         .quarters_[quarter - 1]
+        key = PeriodKey.for_quarter(year, quarter)
+        return QuarterPeriod.find_create_with(key.start_on, key.end_on)
 
     @classmethod
     def current(cls, dont_create=False):
@@ -386,6 +696,7 @@ class Period(models.Model):
                                        dont_create=dont_create)
 
 
+@register_period
 class DayPeriod(Period):
 
     class Meta:
@@ -400,10 +711,12 @@ class DayPeriod(Period):
     def type(cls):
         return cls.DAY
 
+    @localized_cache
     def name(self):
         # Translators: Python's date format for DayPeriod.name()
         return self.middle().strftime(ugettext(u"%x")).decode('utf-8')
 
+    @localized_cache
     def full_name(self):
         # Translators: Python's date format for DayPeriod.full_name()
         return self.middle().strftime(ugettext(u"%Y %B %d")).decode('utf-8')
@@ -425,6 +738,7 @@ class DayPeriod(Period):
         return self.middle().strftime('%d-%m-%Y')
 
 
+@register_period
 class WeekPeriod(Period):
 
     class Meta:
@@ -443,10 +757,12 @@ class WeekPeriod(Period):
     def pid(self):
         return u'W%s' % self.middle().strftime('%W-%Y')
 
+    @localized_cache
     def name(self):
         # Translators: Python's date format for WeekPeriod.name()
         return self.middle().strftime(ugettext(u"%W/%Y")).decode('utf-8')
 
+    @localized_cache
     def full_name(self):
         # Translators: Week Full name representation: weeknum, start and end
         return (u"Week %(weeknum)s (%(start)s to %(end)s)"
@@ -471,6 +787,7 @@ class WeekPeriod(Period):
         return self.middle().strftime('W%W-%Y')
 
 
+@register_period
 class MonthPeriod(Period):
 
     class Meta:
@@ -489,10 +806,12 @@ class MonthPeriod(Period):
     def pid(self):
         return self.middle().strftime('%m%Y')
 
+    @localized_cache
     def name(self):
         # Translators: Python's date format for MonthPeriod.name()
         return self.middle().strftime(ugettext(u"%m %Y")).decode('utf-8')
 
+    @localized_cache
     def full_name(self):
         # Translators: Python's date format for MonthPeriod.full_name()
         return self.middle().strftime(ugettext(u"%B %Y")).decode('utf-8')
@@ -517,6 +836,7 @@ class MonthPeriod(Period):
         return self.middle().strftime('%m-%Y')
 
 
+@register_period
 class QuarterPeriod(Period):
 
     class Meta:
@@ -547,12 +867,14 @@ class QuarterPeriod(Period):
     def pid(self):
         return 'Q%d.%s' % (self.quarter, self.middle().strftime('%Y'))
 
+    @localized_cache
     def name(self):
         # Translators: Python's date format for QuarterPeriod.name()
         return (ugettext(u"Q%(quarter)s.%(year)s")
                 % {'year': self.middle().strftime(ugettext(u"%Y")).decode('utf-8'),
                    'quarter': self.quarter})
 
+    @localized_cache
     def full_name(self):
         def ordinal(value):
             try:
@@ -620,6 +942,7 @@ class QuarterPeriod(Period):
                            self.middle().strftime('%Y'))
 
 
+@register_period
 class YearPeriod(Period):
 
     class Meta:
@@ -634,10 +957,12 @@ class YearPeriod(Period):
     def type(cls):
         return cls.YEAR
 
+    @localized_cache
     def name(self):
         # Translators: Python's date format for YearPeriod.name()
         return self.middle().strftime(ugettext(u"%Y")).decode('utf-8')
 
+    @localized_cache
     def full_name(self):
         return self.name()
 
@@ -649,10 +974,104 @@ class YearPeriod(Period):
     def boundaries(cls, date_obj):
         date_obj = normalize_date(date_obj, as_aware=True)
 
-        start = date_obj.replace(month=0, day=0, hour=0, minute=0,
+        start = date_obj.replace(month=1, day=1, hour=0, minute=0,
                                  second=0, microsecond=0)
         end = start.replace(year=date_obj.year + 1) - timedelta(ONE_MICROSECOND)
         return (start, end)
 
     def strid(self):
         return self.middle().strftime('%Y')
+
+
+class PeriodIdentityMap(object):
+    ''' Process-wide map of Period rows keyed on (type, start_on, end_on)
+
+    Period rows never change once created so instances are shared.
+    Warmed with a single query on first use, bounded by the
+    BOLIBANA_PERIOD_CACHE_SIZE setting (0 disables it) and invalidated
+    by Period post_save and post_delete.
+
+    Nothing is stored while the current transaction has uncommitted
+    writes: a rollback sends no signal and would leave rows which
+    don't exist (and whose id gets reused) in the map. '''
+
+    def __init__(self, maxsize=None):
+        if maxsize is None:
+            maxsize = getattr(settings, 'BOLIBANA_PERIOD_CACHE_SIZE',
+                              DEFAULT_PERIOD_CACHE_SIZE)
+        self.periods = LRUCache(maxsize)
+        self.is_warm = False
+
+    @property
+    def enabled(self):
+        return self.periods.maxsize > 0
+
+    @classmethod
+    def key(cls, period_type, start_on, end_on):
+        return (period_type,
+                normalize_date(start_on, as_aware=True),
+                normalize_date(end_on, as_aware=True))
+
+    def handles(self, cls):
+        ''' whether instances of cls are stored in the map '''
+        return self.enabled and PERIOD_CLASSES.get(cls.type()) is cls
+
+    def lookup(self, cls, period_type, start_on, end_on):
+        ''' shared cls instance for those boundaries or None '''
+        if not self.enabled or PERIOD_CLASSES.get(period_type) is not cls:
+            return None
+        self.warm()
+        period = self.periods.get(self.key(period_type, start_on, end_on))
+        if period is not None and period.__class__ is cls:
+            return period
+        return None
+
+    def add(self, period):
+        klass = PERIOD_CLASSES.get(period.period_type)
+        if not self.enabled or klass is None or period.pk is None:
+            return
+        # might be our own row, gone if the transaction rolls back
+        if transaction.is_dirty(using=router.db_for_write(Period)):
+            return
+        # shared copy. don't recast the caller's instance
+        period = period.typed()
+        self.periods.set(self.key(period.period_type,
+                                  period.start_on, period.end_on), period)
+
+    def discard(self, period):
+        if period.start_on and period.end_on:
+            self.periods.delete(self.key(period.period_type,
+                                         period.start_on, period.end_on))
+        # boundaries might have been edited: drop by id as well
+        if period.pk is not None:
+            for key, cached in self.periods.items():
+                if cached.pk == period.pk:
+                    self.periods.delete(key)
+
+    def warm(self):
+        ''' loads most recent periods in a single query '''
+        if self.is_warm:
+            return
+        self.is_warm = True
+        if not self.enabled:
+            return
+        periods = list(Period.objects
+                             .filter(period_type__in=PERIOD_CLASSES.keys())
+                             .order_by('-start_on')[:self.periods.maxsize])
+        # insert oldest first so recent ones are last to be evicted
+        for period in reversed(periods):
+            self.add(period)
+
+    def clear(self):
+        self.periods.clear()
+        self.is_warm = False
+
+period_cache = PeriodIdentityMap()
+
+
+@receiver(post_save, dispatch_uid='bolibana_period_cache_save')
+@receiver(post_delete, dispatch_uid='bolibana_period_cache_delete')
+def invalidate_period_cache(sender, instance, **kwargs):
+    ''' drop edited or deleted Period (or proxy) rows from period_cache '''
+    if isinstance(instance, Period):
+        period_cache.discard(instance)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from bisect import bisect_left, bisect_right
+
+from django.db import models, transaction
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils.translation import ugettext_lazy as _
+
+from bolibana.tools.db import bulk_insert, batches
+from Period import Period, periods_created
+
+# finest to coarsest. a period is linked to every coarser one including it
+GRANULARITY = (Period.DAY, Period.WEEK, Period.MONTH,
+               Period.QUARTER, Period.YEAR)
+
+
+class PeriodHierarchy(models.Model):
+    """ Materialized containment between periods of different granularity
+
+        One row per (coarser parent, finer child) pair. Maintained when
+        periods are created ; rebuild() regenerates it from scratch.
+
+        Allows grouping data by any coarser period in a single query:
+        DailyReport.objects.filter(period__parent_links__parent_type='month')
+                           .values('period__parent_links__parent')
+                           .annotate(Sum('value')) """
+
+    class Meta:
+        app_label = 'bolibana'
+        unique_together = ('parent', 'child')
+        verbose_name = _(u"Period Hierarchy")
+        verbose_name_plural = _(u"Period Hierarchies")
+
+    parent = models.ForeignKey('Period', related_name='child_links',
+                               verbose_name=_(u"Parent"))
+    child = models.ForeignKey('Period', related_name='parent_links',
+                              verbose_name=_(u"Child"))
+    parent_type = models.CharField(max_length=15, db_index=True,
+                                   choices=Period.PERIOD_TYPES,
+                                   verbose_name=_(u"Parent Type"))
+
+    def __unicode__(self):
+        return u"%(child)s < %(parent)s" % {'child': self.child,
+                                             'parent': self.parent}
+
+    @classmethod
+    def link_pairs(cls, periods, candidates):
+        """ {(parent, child): parent_type} of periods with candidates
+
+            periods are linked both to containing and contained ones. """
+        by_type = {}
+        for candidate in candidates:
+            by_type.setdefault(candidate.period_type, []).append(candidate)
+        for period_type in by_type.keys():
+            by_type[period_type].sort(key=lambda p: p.start_on)
+        starts = dict((period_type, [p.start_on for p in group])
+                      for period_type, group in by_type.items())
+
+        pairs = {}
+        for period in periods:
+            rank = GRANULARITY.index(period.period_type)
+            # coarser: the latest one starting before period may include it
+            for period_type in GRANULARITY[rank + 1:]:
+                if period_type not in by_type:
+                    continue
+                index = bisect_right(starts[period_type], period.start_on) - 1
+                if index < 0:
+                    continue
+                parent = by_type[period_type][index]
+                if parent.end_on >= period.end_on:
+                    pairs[(parent.id, period.id)] = period_type
+            # finer: those starting within period and ending before its end
+            for period_type in GRANULARITY[:rank]:
+                if period_type not in by_type:
+                    continue
+                low = bisect_left(starts[period_type], period.start_on)
+                high = bisect_right(starts[period_type], period.end_on)
+                for child in by_type[period_type][low:high]:
+                    if child.end_on <= period.end_on:
+                        pairs[(period.id, child.id)] = period.period_type
+        return pairs
+
+    @classmethod
+    def link(cls, periods):
+        """ adds missing links for (newly created) periods. """
+        periods = [p for p in periods
+                   if p.period_type in GRANULARITY and p.pk is not None]
+        if not periods:
+            return 0
+
+        start = min(p.start_on for p in periods)
+        end = max(p.end_on for p in periods)
+        # everything overlapping: containing and contained periods.
+        candidates = Period.objects.filter(period_type__in=GRANULARITY,
+                                           start_on__lte=end,
+                                           end_on__gte=start)
+        pairs = cls.link_pairs(periods, candidates)
+
+        ids = [p.id for p in periods]
+        existing = set(cls.objects.filter(models.Q(parent__in=ids)
+                                          | models.Q(child__in=ids))
+                                  .values_list('parent', 'child'))
+        return cls.create_links(dict((pair, ptype)
+                                     for pair, ptype in pairs.items()
+                                     if pair not in existing))
+
+    @classmethod
+    def create_links(cls, pairs, attempts=3):
+        """ bulk inserts {(parent_id, child_id): parent_type} links
+
+            Links created concurrently are skipped. Returns number inserted """
+        for attempt in range(attempts):
+            links = [cls(parent_id=parent_id, child_id=child_id,
+                         parent_type=parent_type)
+                     for (parent_id, child_id), parent_type in pairs.items()]
+            if bulk_insert(cls, links):
+                return len(links)
+            # some linked meanwhile. Without savepoints, some of our
+            # batches may remain: insert only what's still missing.
+            existing = cls.existing_pairs(pairs.keys())
+            pairs = dict((pair, ptype) for pair, ptype in pairs.items()
+                         if pair not in existing)
+        # still racing: one by one
+        created = 0
+        for (parent_id, child_id), parent_type in pairs.items():
+            created += cls.objects.get_or_create(
+                parent_id=parent_id, child_id=child_id,
+                defaults={'parent_type': parent_type})[1]
+        return created
+
+    @classmethod
+    def existing_pairs(cls, pairs):
+        """ set of (parent_id, child_id) pairs having a link """
+        pairs = set(pairs)
+        existing = set()
+        for chunk in batches(pairs):
+            rows = cls.objects.filter(
+                parent__in=set(parent_id for parent_id, child_id in chunk),
+                child__in=set(child_id for parent_id, child_id in chunk)) \
+                .values_list('parent', 'child')
+            existing.update(pair for pair in rows if pair in pairs)
+        return existing
+
+    @classmethod
+    @transaction.commit_on_success
+    def rebuild(cls):
+        """ regenerates the whole hierarchy. Returns number of links """
+        cls.objects.all().delete()
+        periods = list(Period.objects.filter(period_type__in=GRANULARITY))
+        return cls.create_links(cls.link_pairs(periods, periods))
+
+
+@receiver(post_save, dispatch_uid='bolibana_period_hierarchy_save')
+def link_created_period(sender, instance, created, **kwargs):
+    """ links newly saved Period (or proxy) into the hierarchy """
+    if created and isinstance(instance, Period):
+        PeriodHierarchy.link([instance])
+
+
+@receiver(periods_created, dispatch_uid='bolibana_period_hierarchy_bulk')
+def link_bulk_created_periods(sender, periods, **kwargs):
+    """ links periods inserted by Period.from_keys() """
+    PeriodHierarchy.link(periods)
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+import calendar
+from datetime import datetime, timedelta
+from functools import total_ordering
+
+from django.utils import timezone
+
+from bolibana.tools.utils import normalize_date
+
+# period_type -> rank. filled on first use (see PeriodKey.type_rank)
+TYPE_RANKS = {}
+
+
+def as_datetime(date_obj):
+    """ aware datetime from a datetime or date instance (assumes UTC) """
+    if not isinstance(date_obj, datetime):
+        date_obj = datetime(date_obj.year, date_obj.month, date_obj.day,
+                            tzinfo=timezone.utc)
+    return normalize_date(date_obj, as_aware=True)
+
+
+def epoch_microseconds(date_obj):
+    """ integer UTC epoch of a datetime in microseconds """
+    date_obj = normalize_date(date_obj, as_aware=True)
+    return calendar.timegm(date_obj.utctimetuple()) * 1000000 \
+        + date_obj.microsecond
+
+
+def period_ordinal(period_type, start_on):
+    """ sortable integer for a period: epoch of start_on then type rank """
+    return epoch_microseconds(start_on) * 10 + PeriodKey.type_rank(period_type)
+
+
+@total_ordering
+class PeriodKey(object):
+    """ Lightweight value identifying a typed Period (Day, Week, etc)
+
+        Hashable and orderable. All calendar math happens in memory ;
+        the database row is only fetched or created by materialize().
+
+        keys = PeriodKey.span(Period.MONTH, date(2008, 1, 1), date(2012, 12, 31))
+        report.period = keys[0].materialize() """
+
+    __slots__ = ('period_type', 'start_on', 'end_on', '_sort_key')
+
+    def __init__(self, period_type, start_on, end_on):
+        self.period_type = period_type
+        self.start_on = normalize_date(start_on, as_aware=True)
+        self.end_on = normalize_date(end_on, as_aware=True)
+        # same integers as Period.sort_key()
+        self._sort_key = (period_ordinal(period_type, self.start_on),
+                          epoch_microseconds(self.end_on))
+
+    def __repr__(self):
+        return '<PeriodKey %s %s/%s>' % (self.period_type,
+                                         self.start_on.isoformat(),
+                                         self.end_on.isoformat())
+
+    @property
+    def ordinal(self):
+        return self._sort_key[0]
+
+    def sort_key(self):
+        return self._sort_key
+
+    def __eq__(self, other):
+        try:
+            return self._sort_key == other.sort_key()
+        except AttributeError:
+            return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __lt__(self, other):
+        try:
+            return self.sort_key() < other.sort_key()
+        except AttributeError:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash(self._sort_key[0])
+
+    @classmethod
+    def type_rank(cls, period_type):
+        """ position of period_type in Period.PERIOD_TYPES """
+        if not TYPE_RANKS:
+            from bolibana.models.Period import Period
+            TYPE_RANKS.update((ptype, rank) for rank, (ptype, name)
+                              in enumerate(Period.PERIOD_TYPES))
+        return TYPE_RANKS.get(period_type, len(TYPE_RANKS))
+
+    @classmethod
+    def class_for(cls, period_type):
+        """ Period proxy class (DayPeriod, etc) handling period_type """
+        from bolibana.models.Period import PERIOD_CLASSES
+        try:
+            return PERIOD_CLASSES[period_type]
+        except KeyError:
+            raise ValueError(u"No Period class for type %s" % period_type)
+
+    @property
+    def period_class(self):
+        return self.class_for(self.period_type)
+
+    @classmethod
+    def for_date(cls, period_type, date_obj):
+        """ key of the period_type period including date_obj """
+        return cls(period_type,
+                   *cls.class_for(period_type).boundaries(as_datetime(date_obj)))
+
+    @classmethod
+    def for_weeknum(cls, period_type, year, weeknum, is_iso=False):
+        """ key of the week number weeknum of year. Week 0 is partial """
+        from bolibana.models.Period import ONE_SECOND, WeekPeriod
+
+        sy = datetime(year, 1, 1, 0, 0, tzinfo=timezone.utc)
+        ONE_WEEK = WeekPeriod.delta()
+
+        # retrieve start of year day
+        sy_dow = sy.isoweekday() if is_iso else sy.weekday()
+
+        # find first real week (first Mon/Sun)
+        if sy_dow != 0:
+            sy = sy + timedelta(ONE_WEEK - sy_dow)
+
+        # if we want first week, it's from Jan 1st to next Mon/Sun
+        if weeknum == 0:
+            start_week = sy
+            end_week = start_week + timedelta(ONE_WEEK - sy_dow) \
+                - timedelta(ONE_SECOND)
+        else:
+            weeknum -= 1  # cause we've set start as first real week
+            start_week = sy + timedelta(ONE_WEEK * weeknum)
+            end_week = start_week + timedelta(ONE_WEEK) - timedelta(ONE_SECOND)
+
+        return cls(period_type, start_week, end_week)
+
+    @classmethod
+    def for_quarter(cls, year, quarter):
+        """ key of the quarter-th (1-4) quarter of year """
+        from bolibana.models.Period import Period
+        return cls.for_date(Period.QUARTER,
+                            datetime(year, quarter * 3 - 2, 1,
+                                     tzinfo=timezone.utc))
+
+    @classmethod
+    def span(cls, period_type, start, end):
+        """ ordered keys of period_type covering start to end. No query """
+        end = as_datetime(end)
+        keys = []
+        key = cls.for_date(period_type, start)
+        while key.start_on <= end:
+            keys.append(key)
+            key = key.next()
+        return keys
+
+    def next(self):
+        """ key of the following period of same type """
+        return self.for_date(self.period_type,
+                             self.end_on + timedelta(microseconds=1))
+
+    def previous(self):
+        """ key of the preceding period of same type """
+        return self.for_date(self.period_type,
+                             self.start_on - timedelta(microseconds=1))
+
+    def includes(self, date_obj):
+        return self.start_on <= as_datetime(date_obj) <= self.end_on
+
+    def as_period(self):
+        """ unsaved Period instance. Enough for name() & co. No query """
+        return self.period_class(start_on=self.start_on, end_on=self.end_on,
+                                 period_type=self.period_type)
+
+    def materialize(self):
+        """ database Period row for this key. Created if missing """
+        return self.period_class.find_create_with(self.start_on, self.end_on,
+                                                  self.period_type)
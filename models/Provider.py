@@ -4,13 +4,30 @@
 
 from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.utils.translation import ugettext_lazy as _, ugettext
 
+from bolibana.tools.caching import get_versions, bump_versions
 from bolibana.tools.utils import generate_user_hash
+from Access import Access
+from Role import Role
 
+# versions of compiled permissions. see permissions_version()
+PERMISSIONS_VERSION_KEY = 'bolibana_permissions_version'
+PROVIDER_VERSION_KEY = 'bolibana_permissions_version_%d'
 
-class ActiveManager(models.Manager):
+
+class ProviderManager(models.Manager):
+
+    def with_accesses(self):
+        """ user joined, accesses, roles and targets prefetched
+
+            first_access(), name_access() & co. then need no query """
+        return self.select_related('user') \
+                   .prefetch_related('access__role', 'access__target')
+
+
+class ActiveManager(ProviderManager):
 
     def get_query_set(self):
         return super(ActiveManager, self).get_query_set() \
@@ -44,7 +61,7 @@ class Provider(models.Model):
                               verbose_name=_(u"Password Hash"))
 
     # django manager first
-    objects = models.Manager()
+    objects = ProviderManager()
     active = ActiveManager()
 
     def __unicode__(self):
@@ -96,13 +113,8 @@ class Provider(models.Model):
 
     def has_permission(self, perm_slug, entity=None):
         """ whether or not User has this permission for Enitity """
-        qs = self.access.all()
-        if entity is not None:
-            qs = qs.filter(target=entity)
-        for access in qs:
-            if perm_slug in [p.slug for p in access.role.permissions.all()]:
-                return True
-        return False
+        from bolibana.tools.permissions import provider_permissions
+        return provider_permissions(self).can(perm_slug, entity)
 
     def first_role(self):
         """ only or main role if Provider has many """
@@ -255,3 +267,86 @@ def create_user_provider(sender, instance, created, **kwargs):
 
 post_save.connect(create_user_provider, sender=User)
 post_save.connect(save_associated_user, sender=Provider)
+
+
+def permissions_version(provider_id, *keys):
+    """ (global, provider) versions of provider's permissions
+
+        Any change to its accesses, their roles or permissions bumps one.
+        Extra cache keys are fetched in the same round-trip and
+        returned in a dict as last element. """
+    version_keys = [PERMISSIONS_VERSION_KEY, PROVIDER_VERSION_KEY % provider_id]
+    values = get_versions(version_keys, keys)
+    return (values[version_keys[0]], values[version_keys[1]],
+            dict((key, values[key]) for key in keys))
+
+
+def bump_permissions_version(provider_ids=None):
+    """ invalidates compiled permissions of providers (all if None) """
+    if provider_ids is None:
+        bump_versions([PERMISSIONS_VERSION_KEY])
+    else:
+        bump_versions([PROVIDER_VERSION_KEY % pid
+                       for pid in set(provider_ids)])
+
+
+def provider_access_changed(sender, instance, action, reverse,
+                            pk_set, **kwargs):
+    """ Provider.access changed: invalidates affected providers """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        instance.__dict__.pop('_compiled_permissions', None)
+        # accesses prefetched by load_provider() are outdated
+        instance.__dict__.pop('_prefetched_objects_cache', None)
+        bump_permissions_version([instance.id])
+    elif pk_set:
+        bump_permissions_version(pk_set)
+    else:
+        # access.provider_set.clear(): rows are gone already
+        bump_permissions_version()
+
+
+def role_permissions_changed(sender, instance, action, reverse,
+                             pk_set, **kwargs):
+    """ Role.permissions changed: invalidates providers with that role """
+    if not action.startswith('post_'):
+        return
+    if not reverse:
+        roles = [instance.pk]
+    elif pk_set:
+        roles = pk_set
+    else:
+        bump_permissions_version()
+        return
+    bump_permissions_version(Provider.objects.filter(access__role__in=roles)
+                                             .values_list('id', flat=True))
+
+
+def access_or_role_saved(sender, instance, created, **kwargs):
+    """ Access (target, role) or Role changed: invalidates its providers """
+    if created:
+        return
+    if sender is Access:
+        providers = Provider.objects.filter(access=instance)
+    else:
+        providers = Provider.objects.filter(access__role=instance)
+    bump_permissions_version(providers.values_list('id', flat=True))
+
+
+def access_or_role_deleted(sender, instance, **kwargs):
+    """ links to providers are deleted already: invalidates all """
+    bump_permissions_version()
+
+
+def provider_deleted(sender, instance, **kwargs):
+    """ sessions holding a snapshot of it must reload (and find none) """
+    bump_permissions_version([instance.id])
+
+m2m_changed.connect(provider_access_changed, sender=Provider.access.through)
+m2m_changed.connect(role_permissions_changed, sender=Role.permissions.through)
+post_save.connect(access_or_role_saved, sender=Access)
+post_save.connect(access_or_role_saved, sender=Role)
+post_delete.connect(access_or_role_deleted, sender=Access)
+post_delete.connect(access_or_role_deleted, sender=Role)
+post_delete.connect(provider_deleted, sender=Provider)
@@ -45,11 +45,30 @@ class ValidationMixin(object):
         return self.filter(_status__in=complete_status())
 
 
-class ValidationQuerySet(QuerySet, ValidationMixin):
+class VisibilityMixin(object):
+    def visible_to(self, provider, permission):
+        """ rows which entity is within provider's permitted subtrees
+
+            A single filter on Entity's MPTT columns. """
+        from bolibana.tools.permissions import provider_permissions
+        return self.filter(provider_permissions(provider)
+                           .entity_filter(permission, 'entity__'))
+
+
+class VisibilityQuerySet(QuerySet, VisibilityMixin):
+    pass
+
+
+class VisibilityManager(models.Manager, VisibilityMixin):
+    def get_query_set(self):
+        return VisibilityQuerySet(self.model, using=self._db)
+
+
+class ValidationQuerySet(QuerySet, ValidationMixin, VisibilityMixin):
     pass
 
 
-class ValidationManager(models.Manager, ValidationMixin):
+class ValidationManager(models.Manager, ValidationMixin, VisibilityMixin):
     def get_query_set(self):
         return ValidationQuerySet(self.model, using=self._db)
 
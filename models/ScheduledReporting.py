@@ -6,6 +6,7 @@ from django.db import models
 from django.utils.translation import ugettext_lazy as _
 
 from ExpectedReporting import REPORTING_LEVELS
+from Report import VisibilityManager
 
 
 class ScheduledReporting(models.Model):
@@ -30,6 +31,8 @@ class ScheduledReporting(models.Model):
                             related_name='entity_rcls_providers_ending',
                             null=True, blank=True)
 
+    objects = VisibilityManager()
+
     def __unicode__(self):
         return (u"%(entity)s/%(report_class)s:%(level)s"
                 % {'entity': self.entity,
@@ -3,6 +3,8 @@
 # maintainer: rgaudin
 
 from Period import Period, MonthPeriod, YearPeriod, WeekPeriod, QuarterPeriod, DayPeriod
+from PeriodKey import PeriodKey
+from PeriodHierarchy import PeriodHierarchy
 from EntityType import EntityType
 from Entity import Entity
 from Report import Report
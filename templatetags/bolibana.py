@@ -11,7 +11,8 @@ from django.core.urlresolvers import reverse
 from babeldjango.templatetags.babel import datefmt
 
 from ..models import Report
-from ..tools.utils import clean_phone_number
+from ..tools.utils import clean_phone_number, provider_can
+from ..tools.entities import ancestor_index
 
 locale.setlocale(locale.LC_ALL, '')
 
@@ -197,13 +198,8 @@ def format_percent_us(value, precision=2, french=True):
 
 
 def get_parent_by_type(entity, type):
-    if entity.type.slug == type:
-        return entity
-    while entity.parent:
-        if entity.parent.type.slug == type:
-            return entity.parent
-        entity = entity.parent
-    return None
+    """ entity or its closest ancestor of type. see EntityAncestorIndex """
+    return ancestor_index.ancestor(entity, type)
 
 
 @register.filter(name='region')
@@ -248,7 +244,8 @@ def css_rate_class(rate):
 @register.filter(name='has_permission')
 def provider_has_permission(provider, perm_slug=None):
     try:
-        return provider.has_permission(perm_slug)
+        # same as provider.has_permission() without loading a lazy provider
+        return provider_can(perm_slug, provider)
     except:
         return False
 
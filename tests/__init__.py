@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from bolibana.tests.periods import *
+from bolibana.tests.permissions import *
+from bolibana.tests.accesses import *
+from bolibana.tests.middleware import *
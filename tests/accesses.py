@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.contrib import admin
+from django.contrib.admin.util import lookup_field
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from bolibana.admin import ProviderAdmin
+from bolibana.models import Entity, Role, Access, Provider
+from bolibana.tests.permissions import create_entities
+from bolibana.web.views.providers import ProvidersListView
+
+
+class AccessTargetsPrefetchTest(TestCase):
+    """ listing providers with their access costs the same number of
+        queries whatever the number of providers """
+
+    def setUp(self):
+        create_entities()
+        self.role = Role.objects.create(slug='dtc', name=u"DTC")
+        self.entities = list(Entity.objects.order_by('id'))
+
+    def add_providers(self, count):
+        offset = Provider.objects.count()
+        for index in range(offset, offset + count):
+            user = User.objects.create(username='user%d' % index)
+            Provider.objects.get(user=user).access.add(
+                Access.find_by(self.role,
+                               self.entities[index % len(self.entities)]))
+
+    def assertListQueries(self, num, func):
+        """ same count for 2 and 8 providers """
+        for count in (2, 6):
+            self.add_providers(count)
+            self.assertNumQueries(num, func)
+
+    def test_admin_changelist(self):
+        model_admin = ProviderAdmin(Provider, admin.site)
+        request = RequestFactory().get('/admin/bolibana/provider/')
+
+        def changelist():
+            for provider in model_admin.queryset(request):
+                for name in model_admin.list_display:
+                    unicode(lookup_field(name, provider, model_admin)[2])
+
+        # providers with users, accesses, roles then Entity targets
+        self.assertListQueries(4, changelist)
+
+    def test_providers_list(self):
+        def providers_list():
+            for provider in ProvidersListView().get_queryset():
+                provider.name_access()
+
+        self.assertListQueries(4, providers_list)
+
+    def test_access_targets(self):
+        def accesses():
+            for access in Access.objects.with_targets():
+                access.name()
+
+        # accesses with roles then Entity targets
+        self.assertListQueries(2, accesses)
+        self.assertNumQueries(
+            1, Access.prefetch_targets,
+            list(Access.objects.select_related('role')))
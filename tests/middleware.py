@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.http import HttpResponse
+from django.template import Template, RequestContext
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from bolibana.models import Entity, Permission, Role, Access, Provider
+from bolibana.tests.permissions import create_entities
+from bolibana.tools.entities import tree_snapshot
+from bolibana.tools.utils import provider_can
+from bolibana.web.decorators import provider_permission
+
+DASHBOARD = u"{% load bolibana %}{{ web_provider.name_access }} " \
+            u"{{ level }} {% if web_provider|has_permission:'can_view' %}" \
+            u"can view{% endif %}"
+
+
+@provider_permission('can_view')
+def dashboard(request):
+    """ typical page: decorator, profile, checks and context processors """
+    provider = request.user.get_profile()
+    allowed = [entity.slug for entity in Entity.objects.order_by('slug')
+               if provider_can('can_view', provider, entity)]
+    page = Template(DASHBOARD).render(RequestContext(request))
+    return HttpResponse(u"%s %s" % (page, u",".join(allowed)))
+
+
+@override_settings(
+    ROOT_URLCONF='bolibana.tests.urls',
+    MIDDLEWARE_CLASSES=(
+        'django.contrib.sessions.middleware.SessionMiddleware',
+        'django.contrib.auth.middleware.AuthenticationMiddleware',
+        'bolibana.web.middleware.EntityTreeMiddleware',
+        'bolibana.web.middleware.ProviderMiddleware'),
+    TEMPLATE_CONTEXT_PROCESSORS=(
+        'django.core.context_processors.request',
+        'bolibana.web.context_processors.add_provider',
+        'bolibana.web.context_processors.add_level'),
+    # no session query in counts
+    SESSION_ENGINE='django.contrib.sessions.backends.signed_cookies',
+    AUTH_PROFILE_MODULE='bolibana.Provider',
+    ENABLE_FORTUNE=False)
+class ProviderMiddlewareQueriesTest(TestCase):
+    """ the provider is loaded once per request, whatever the page uses """
+
+    def setUp(self):
+        create_entities()
+        Permission.objects.create(slug='can_view')
+        role = Role.objects.create(slug='dtc', name=u"DTC")
+        role.permissions.add('can_view')
+        user = User.objects.create(username='bob')
+        user.set_password('bob')
+        user.save()
+        Provider.objects.get(user=user).access.add(
+            Access.find_by(role, Entity.objects.get(slug='r1')))
+        self.client.login(username='bob', password='bob')
+        # tree snapshot and content types loaded once per process
+        tree_snapshot.refresh()
+        ContentType.objects.get_for_model(Entity)
+
+    def test_dashboard(self):
+        # user, then provider with accesses, roles, permissions and
+        # targets, then the view's entities
+        with self.assertNumQueries(6):
+            response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(u'can view' in response.content)
+        self.assertTrue(response.content.endswith('r1,r1d0,r1d1,r1d2'))
+
+    def test_autocomplete(self):
+        self.client.get('/entities/autocomplete/', {'q': 'reg'})
+        # user then provider. The search index is in memory.
+        with self.assertNumQueries(5):
+            response = self.client.get('/entities/autocomplete/',
+                                       {'q': 'reg'})
+        self.assertEqual(response.status_code, 200)
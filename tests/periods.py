@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from datetime import datetime, date
+
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from bolibana.models import Period, MonthPeriod, DayPeriod
+from bolibana.models.Period import period_cache
+
+
+class PeriodCacheRollbackTest(TransactionTestCase):
+    """ periods created in a rolled back transaction aren't cached """
+
+    def setUp(self):
+        period_cache.clear()
+
+    def tearDown(self):
+        period_cache.clear()
+
+    def test_rolled_back_period_not_cached(self):
+        @transaction.commit_on_success
+        def create_then_fail():
+            MonthPeriod.find_create_from(2014, 5)
+            raise ValueError
+
+        self.assertRaises(ValueError, create_then_fail)
+        self.assertEqual(Period.objects.count(), 0)
+
+        may = MonthPeriod.find_create_from(2014, 5)
+        self.assertTrue(Period.objects.filter(id=may.id,
+                                              start_on=may.start_on).exists())
+        # the database may hand out the rolled back id again
+        june = may.next()
+        self.assertNotEqual(may.id, june.id)
+        self.assertEqual(MonthPeriod.find_create_from(2014, 5).id, may.id)
+
+    def test_committed_period_cached(self):
+        may = MonthPeriod.find_create_from(2014, 5)
+        self.assertNumQueries(0, MonthPeriod.find_create_from, 2014, 5)
+        self.assertEqual(MonthPeriod.find_create_from(2014, 5).id, may.id)
+
+
+class ContainingLookupTest(TestCase):
+    """ find_create_by_date() is a single indexed query whatever the
+        number of periods """
+
+    def setUp(self):
+        # measure the database path
+        self.maxsize = period_cache.periods.maxsize
+        period_cache.periods.maxsize = 0
+        period_cache.clear()
+        Period.ensure_range(date(2011, 1, 1), date(2013, 12, 31))
+
+    def tearDown(self):
+        period_cache.periods.maxsize = self.maxsize
+        period_cache.clear()
+
+    def test_single_query(self):
+        moment = datetime(2012, 6, 15, 10, 30, tzinfo=timezone.utc)
+        for cls in (DayPeriod, MonthPeriod):
+            with self.assertNumQueries(1):
+                period = cls.find_create_by_date(moment)
+            # range filter on the index, first row only
+            sql = connection.queries[-1]['sql']
+            self.assertTrue(u'start_on' in sql and u'LIMIT 1' in sql)
+            self.assertTrue(period.start_on <= moment <= period.end_on)
+            self.assertEqual(period.period_type, cls.type())
+
+    def test_created_when_missing(self):
+        moment = datetime(2020, 2, 29, 12, tzinfo=timezone.utc)
+        with self.assertNumQueries(6):
+            # containing, exact lookup, insert, fetch of the new row then
+            # candidates and existing links of the period hierarchy
+            period = DayPeriod.find_create_by_date(moment)
+        self.assertEqual(period.start_on,
+                         datetime(2020, 2, 29, tzinfo=timezone.utc))
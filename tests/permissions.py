@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.test import TestCase
+
+from bolibana.models import (Entity, EntityType, Permission, Role, Access,
+                             Provider)
+from bolibana.tools.entities import import_entities, tree_snapshot
+from bolibana.tools.permissions import PERMISSIONS_KEY
+from bolibana.tools.utils import load_provider, provider_can
+
+
+def create_entities():
+    """ mali > 3 regions > 3 districts each """
+    for slug in ('country', 'region', 'district'):
+        EntityType.objects.create(slug=slug, name=slug)
+    rows = [{'slug': 'mali', 'name': u"Mali", 'type': 'country'}]
+    for region in range(3):
+        rows.append({'slug': 'r%d' % region, 'name': u"Region %d" % region,
+                     'type': 'region', 'parent': 'mali'})
+        for district in range(3):
+            rows.append({'slug': 'r%dd%d' % (region, district),
+                         'name': u"District %d %d" % (region, district),
+                         'type': 'district', 'parent': 'r%d' % region})
+    import_entities(rows)
+
+
+class CompiledPermissionsTest(TestCase):
+    """ permission checks are answered from compiled intervals """
+
+    def setUp(self):
+        create_entities()
+        Permission.objects.create(slug='can_view')
+        self.role = Role.objects.create(slug='dtc', name=u"DTC")
+        self.role.permissions.add('can_view')
+        self.user = User.objects.create(username='bob')
+        self.region = Entity.objects.get(slug='r1')
+        provider = Provider.objects.get(user=self.user)
+        provider.access.add(Access.find_by(self.role, self.region))
+
+        self.entities = list(Entity.objects.all())
+        self.expected = dict((entity.slug,
+                              entity.is_descendant_of(self.region,
+                                                      include_self=True))
+                             for entity in self.entities)
+        # tree snapshot and content types loaded once per process
+        tree_snapshot.refresh()
+        ContentType.objects.get_for_model(Entity)
+
+    def test_compile_single_query(self):
+        provider = Provider.objects.get(user=self.user)
+        cache.delete(PERMISSIONS_KEY % provider.id)
+        with self.assertNumQueries(1):
+            provider.has_permission('can_view', self.region)
+
+    def test_checks_need_no_query(self):
+        provider = load_provider(self.user)
+        provider_can('can_view', provider)
+        with self.assertNumQueries(0):
+            for entity in self.entities:
+                self.assertEqual(provider_can('can_view', provider, entity),
+                                 self.expected[entity.slug])
+                self.assertEqual(provider.has_permission('can_view',
+                                                         entity),
+                                 self.expected[entity.slug])
+            self.assertFalse(provider_can('can_edit', provider))
+
+    def test_new_access_invalidates(self):
+        provider = load_provider(self.user)
+        other = Entity.objects.get(slug='r2d0')
+        self.assertFalse(provider_can('can_view', provider, other))
+        provider.access.add(Access.find_by(self.role, other))
+        self.assertTrue(provider_can('can_view', provider, other))
@@ -0,0 +1,11 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.conf.urls import patterns, url
+
+urlpatterns = patterns('',
+    url(r'^entities/autocomplete/$',
+        'bolibana.web.views.entities.entities_autocomplete'),
+    url(r'^dashboard/$', 'bolibana.tests.middleware.dashboard'),
+)
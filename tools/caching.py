@@ -15,6 +15,9 @@
 
         heavy_function(1, 2, cache=True) '''
 
+import threading
+import time
+from collections import OrderedDict
 from functools import wraps
 
 DEFAULT_CACHE_EXPIRY = 15 * 60  # 15mn
@@ -182,3 +185,80 @@ def cache_result(ident=None, store='default'):
             return value
         return wraps(target_method)(_wrapped_func)
     return inner_decorator
+
+
+class LRUCache(object):
+    ''' Bounded in-process mapping dropping least recently used entries
+
+        Thread-safe. maxsize=0 disables storage entirely. '''
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            # re-insert as most recently used
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def get_versions(keys, extra_keys=()):
+    ''' {key: value} of version counters in keys and plain extra_keys
+
+        Single round-trip to the default cache. Missing counters are
+        started from current time (ms) so an evicted one never goes
+        backward. Extra keys default to None. '''
+    from django.core.cache import cache
+
+    keys = list(keys)
+    extra_keys = list(extra_keys)
+    values = cache.get_many(keys + extra_keys) or {}
+    for key in keys:
+        if values.get(key) is None:
+            cache.add(key, int(time.time() * 1000))
+            values[key] = cache.get(key)
+    return dict((key, values.get(key)) for key in keys + extra_keys)
+
+
+def bump_versions(keys):
+    ''' increments version counters. see get_versions() '''
+    from django.core.cache import cache
+
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, int(time.time() * 1000))
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.db import transaction, router, IntegrityError
+from django.db.models import AutoField
+
+# SQLite refuses statements with more variables than this
+MAX_VARIABLES = 999
+# ids per IN clause
+BULK_BATCH_SIZE = 300
+
+
+def batches(items, size=BULK_BATCH_SIZE):
+    """ successive lists of at most size items """
+    items = list(items)
+    for index in range(0, len(items), size):
+        yield items[index:index + size]
+
+
+def bulk_insert(model, instances):
+    """ bulk_create() of instances within SQLite's variables limit
+
+        Returns False if a row violates a unique constraint (created
+        concurrently). Under autocommit, batches are then all rolled
+        back. Within a transaction, a savepoint undoes them only if the
+        backend supports savepoints (not SQLite): callers must re-read
+        what exists before retrying. """
+    using = router.db_for_write(model)
+    columns = len([field for field in model._meta.local_fields
+                   if not isinstance(field, AutoField)])
+    size = max(MAX_VARIABLES // max(columns, 1), 1)
+    manager = model._default_manager.db_manager(using)
+
+    if not transaction.is_managed(using=using):
+        # autocommit would commit each batch on its own
+        try:
+            with transaction.commit_on_success(using=using):
+                for batch in batches(instances, size):
+                    manager.bulk_create(batch)
+        except IntegrityError:
+            return False
+        return True
+
+    sid = transaction.savepoint(using=using)
+    try:
+        for batch in batches(instances, size):
+            manager.bulk_create(batch)
+    except IntegrityError:
+        transaction.savepoint_rollback(sid, using=using)
+        return False
+    transaction.savepoint_commit(sid, using=using)
+    return True
@@ -0,0 +1,776 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+import re
+import threading
+import unicodedata
+from array import array
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction, connections, router
+from django.db.models import Max
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import Signal, receiver
+from django.utils.translation import ugettext
+
+from bolibana.models import Entity, EntityType, Options, Provider
+from bolibana.models.Entity import tree_generation, bump_tree_generation
+from bolibana.tools.db import bulk_insert, batches, MAX_VARIABLES
+
+# sent once reorganize_entities() committed. report is its return value.
+entities_moved = Signal(providing_args=['report'])
+
+
+class EntityTree(object):
+    """ One load of the Entity MPTT tree. Never modified once built
+
+        Arrays of id/parent/lft/rght/level/tree_id ordered by (tree_id, lft)
+        Answers hierarchy questions without touching the database. """
+
+    def __init__(self, generation=None, rows=()):
+        self.generation = generation
+        self.ids = array('l')
+        self.parents = array('l')  # 0 for root entities
+        self.lfts = array('l')
+        self.rghts = array('l')
+        self.levels = array('l')
+        self.tree_ids = array('l')
+        self.types = []
+        # entity id -> position in arrays
+        self.positions = {}
+        self.children_ids = {}
+        for pos, (eid, parent_id, lft, rght, level, tree_id, type_slug) \
+                in enumerate(rows):
+            self.ids.append(eid)
+            self.parents.append(parent_id or 0)
+            self.lfts.append(lft)
+            self.rghts.append(rght)
+            self.levels.append(level)
+            self.tree_ids.append(tree_id)
+            self.types.append(type_slug)
+            self.positions[eid] = pos
+            self.children_ids.setdefault(parent_id, []).append(eid)
+
+    def position(self, entity):
+        return self.positions.get(getattr(entity, 'id', entity))
+
+    def parent_id(self, entity):
+        pos = self.position(entity)
+        if pos is None:
+            return None
+        return self.parents[pos] or None
+
+    def type_slug(self, entity):
+        pos = self.position(entity)
+        if pos is None:
+            return None
+        return self.types[pos]
+
+    def interval(self, entity):
+        """ (tree_id, lft, rght) of entity or None """
+        pos = self.position(entity)
+        if pos is None:
+            return None
+        return (self.tree_ids[pos], self.lfts[pos], self.rghts[pos])
+
+    def is_descendant(self, entity, ancestor, include_self=False):
+        """ whether entity is within ancestor's subtree """
+        pos = self.position(entity)
+        apos = self.position(ancestor)
+        if pos is None or apos is None:
+            return False
+        if pos == apos:
+            return include_self
+        return self.tree_ids[pos] == self.tree_ids[apos] \
+            and self.lfts[apos] < self.lfts[pos] \
+            and self.rghts[pos] < self.rghts[apos]
+
+    def descendant_ids(self, entity, include_self=False):
+        """ ids of entity's subtree in tree order """
+        pos = self.position(entity)
+        if pos is None:
+            return []
+        # descendants are the (rght - lft - 1) / 2 following positions
+        count = (self.rghts[pos] - self.lfts[pos] - 1) // 2
+        start = pos if include_self else pos + 1
+        return self.ids[start:pos + 1 + count].tolist()
+
+    def ancestors(self, entity, include_self=False):
+        """ ids from root down to entity's parent (or entity) """
+        pos = self.position(entity)
+        if pos is None:
+            return []
+        ids = [self.ids[pos]] if include_self else []
+        parent_id = self.parents[pos]
+        while parent_id:
+            ids.append(parent_id)
+            parent_id = self.parents[self.positions[parent_id]]
+        ids.reverse()
+        return ids
+
+    def children(self, entity):
+        """ ids of entity's direct children """
+        return list(self.children_ids.get(getattr(entity, 'id', entity), []))
+
+
+class EntityTreeSnapshot(object):
+    """ Process-local EntityTree reloaded when tree_generation() changes
+
+        A reload builds a new EntityTree then swaps it in: readers holding
+        the previous one keep a consistent view. Callers doing several
+        lookups should use the EntityTree returned by refresh(). """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.tree = EntityTree()
+
+    def refresh(self):
+        """ current EntityTree. reloaded if the tree changed since """
+        generation = tree_generation()
+        tree = self.tree
+        if generation == tree.generation:
+            return tree
+        with self.lock:
+            # another thread may have reloaded while we waited
+            tree = self.tree
+            if generation != tree.generation:
+                rows = Entity.objects.order_by('tree_id', 'lft') \
+                                     .values_list('id', 'parent', 'lft',
+                                                  'rght', 'level', 'tree_id',
+                                                  'type__slug')
+                tree = EntityTree(generation, rows)
+                self.tree = tree
+        return tree
+
+    @property
+    def version(self):
+        return self.tree.generation
+
+    def parent_id(self, entity):
+        return self.refresh().parent_id(entity)
+
+    def interval(self, entity):
+        """ (tree_id, lft, rght) of entity or None """
+        return self.refresh().interval(entity)
+
+    def type_slug(self, entity):
+        return self.refresh().type_slug(entity)
+
+    def is_descendant(self, entity, ancestor, include_self=False):
+        """ whether entity is within ancestor's subtree """
+        return self.refresh().is_descendant(entity, ancestor, include_self)
+
+    def descendant_ids(self, entity, include_self=False):
+        """ ids of entity's subtree in tree order """
+        return self.refresh().descendant_ids(entity, include_self)
+
+    def ancestors(self, entity, include_self=False):
+        """ ids from root down to entity's parent (or entity) """
+        return self.refresh().ancestors(entity, include_self)
+
+    def children(self, entity):
+        """ ids of entity's direct children """
+        return self.refresh().children(entity)
+
+tree_snapshot = EntityTreeSnapshot()
+
+
+class EntityAncestorIndex(object):
+    """ ancestor-by-type lookups without walking entity.parent
+
+        Reads parents and types from tree_snapshot. Its state is
+        replaced (not emptied) whenever the snapshot reloads.
+
+        ancestor_index.ancestor(cscom, 'region') => Entity or None """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        # (EntityTree, {entity id: {type slug: closest ancestor id}},
+        #  {ancestor id: Entity fetched on demand})
+        self.state = (EntityTree(), {}, {})
+
+    def refresh(self):
+        """ state matching the current EntityTree """
+        tree = tree_snapshot.refresh()
+        state = self.state
+        if state[0] is tree:
+            return state
+        with self.lock:
+            state = self.state
+            if state[0] is not tree:
+                state = (tree, {}, {})
+                self.state = state
+        return state
+
+    def types_for(self, entity_id, state=None):
+        """ {type slug: ancestor id} for entity_id and its ancestors """
+        tree, by_type, entities = state or self.refresh()
+        if entity_id in by_type:
+            return by_type[entity_id]
+
+        # walk up until a known entry then fill the path down
+        path = []
+        eid = entity_id
+        while eid is not None and eid not in by_type \
+                and tree.position(eid) is not None:
+            path.append(eid)
+            eid = tree.parent_id(eid)
+        mapping = by_type.get(eid, {})
+        for eid in reversed(path):
+            mapping = dict(mapping)
+            # closest ancestor of a type wins
+            mapping[tree.type_slug(eid)] = eid
+            by_type[eid] = mapping
+        return by_type.get(entity_id, {})
+
+    def ancestor_id(self, entity, type_slug, include_self=True, state=None):
+        state = state or self.refresh()
+        entity_id = getattr(entity, 'id', entity)
+        if not include_self:
+            entity_id = state[0].parent_id(entity_id)
+        return self.types_for(entity_id, state).get(type_slug)
+
+    def ancestor(self, entity, type_slug, include_self=True):
+        """ closest Entity of type_slug from entity up to root or None """
+        state = self.refresh()
+        eid = self.ancestor_id(entity, type_slug, include_self, state)
+        if eid is None:
+            return None
+        return self.fetch([eid], state)[eid]
+
+    def ancestors(self, entities, type_slug, include_self=True):
+        """ {entity id: ancestor Entity or None} in at most one query """
+        state = self.refresh()
+        ids = dict((getattr(entity, 'id', entity),
+                    self.ancestor_id(entity, type_slug, include_self, state))
+                   for entity in entities)
+        found = self.fetch([eid for eid in ids.values() if eid is not None],
+                           state)
+        return dict((eid, found.get(aid)) for eid, aid in ids.items())
+
+    def fetch(self, ids, state=None):
+        """ {id: Entity} from instance cache, querying missing ones """
+        entities = (state or self.refresh())[2]
+        missing = [eid for eid in ids if eid not in entities]
+        if missing:
+            entities.update(Entity.objects.in_bulk(missing))
+        return dict((eid, entities[eid]) for eid in ids if eid in entities)
+
+ancestor_index = EntityAncestorIndex()
+
+
+def number_trees(parents, sort_keys, tree_ids, next_tree_id):
+    """ {node: (tree_id, lft, rght, level)} as mptt's rebuild() sets them
+
+        parents: {node: parent node or None} of whole trees.
+        sort_keys: {node: key} ordering siblings (and roots).
+        tree_ids: {root: tree_id} kept ; other roots numbered
+        from next_tree_id. Nodes within a cycle are left out. """
+    children = {}
+    for node, parent in parents.items():
+        children.setdefault(parent, []).append(node)
+    for siblings in children.values():
+        siblings.sort(key=sort_keys.get)
+
+    values = {}
+    for root in children.get(None, []):
+        tree_id = tree_ids.get(root)
+        if tree_id is None:
+            tree_id = next_tree_id
+            next_tree_id += 1
+        counter = 0
+        lfts = {}
+        stack = [(root, 0, True)]
+        while stack:
+            node, level, entering = stack.pop()
+            counter += 1
+            if entering:
+                lfts[node] = counter
+                stack.append((node, level, False))
+                stack.extend((child, level + 1, True)
+                             for child in reversed(children.get(node, [])))
+            else:
+                values[node] = (tree_id, lfts.pop(node), counter, level)
+    return values
+
+
+def save_tree_values(values, current):
+    """ writes {id: (tree_id, lft, rght, level)} differing from current
+
+        Batched CASE updates instead of mptt's query per node.
+        Returns number of rows updated. """
+    changed = [(eid, value) for eid, value in values.items()
+               if current.get(eid) != value]
+    if not changed:
+        return 0
+
+    using = router.db_for_write(Entity)
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    opts = Entity._mptt_meta
+    columns = [Entity._meta.get_field(name).column
+               for name in (opts.tree_id_attr, opts.left_attr,
+                            opts.right_attr, opts.level_attr)]
+    pk = qn(Entity._meta.pk.column)
+    # two variables per column and one for IN per row
+    size = MAX_VARIABLES // (len(columns) * 2 + 1)
+
+    cursor = connection.cursor()
+    for chunk in batches(changed, size):
+        cases = []
+        params = []
+        for index, column in enumerate(columns):
+            cases.append(u"%s = CASE %s %s END"
+                         % (qn(column), pk,
+                            u" ".join([u"WHEN %s THEN %s"] * len(chunk))))
+            for eid, value in chunk:
+                params.extend((eid, value[index]))
+        params.extend([eid for eid, value in chunk])
+        cursor.execute(u"UPDATE %s SET %s WHERE %s IN (%s)"
+                       % (qn(Entity._meta.db_table), u", ".join(cases), pk,
+                          u", ".join([u"%s"] * len(chunk))), params)
+    transaction.set_dirty(using=using)
+    return len(changed)
+
+
+def import_entities(rows):
+    """ creates or updates Entities in bulk. MPTT values computed in memory
+
+        rows: iterable of dicts with slug, name, type (EntityType slug),
+        parent (slug, empty for roots) and optional phone_number.
+        Existing slugs are updated and reparented. Running twice is a no-op.
+
+        Returns Options(created=int, updated=int, moved=int) """
+    result = _import_entities(rows)
+    if result.created or result.updated or result.moved:
+        # queryset updates sent no signal. bumped once committed so
+        # no one caches the tree while it's being written.
+        bump_tree_generation()
+    return result
+
+
+def duplicates(values):
+    """ comma separated values appearing more than once """
+    seen = set()
+    repeated = set()
+    for value in values:
+        if value in seen:
+            repeated.add(value)
+        seen.add(value)
+    return u", ".join(sorted(repeated))
+
+
+@transaction.commit_on_success
+def _import_entities(rows):
+    rows = list(rows)
+    types = dict(EntityType.objects.values_list('slug', 'id'))
+    existing = dict((e[0], e) for e in Entity.objects.values_list(
+        'slug', 'id', 'name', 'type', 'parent', 'phone_number',
+        'tree_id', 'lft', 'rght', 'level'))
+
+    def phone_number(row):
+        return row.get('phone_number', row.get('phone')) or None
+
+    # validate everything before touching the database
+    for index, row in enumerate(rows):
+        for key in ('slug', 'name', 'type'):
+            if not row.get(key):
+                raise ValueError(u"Missing %(key)s in row %(row)d"
+                                 % {'key': key, 'row': index + 1})
+    row_slugs = [row['slug'] for row in rows]
+    if len(row_slugs) != len(set(row_slugs)):
+        raise ValueError(u"Duplicate slugs: %s" % duplicates(row_slugs))
+    slugs = set(existing.keys()) | set(row_slugs)
+    # phone numbers once imported: rows override existing entities
+    phones = dict((slug, e[5]) for slug, e in existing.items())
+    phones.update((row['slug'], phone_number(row)) for row in rows)
+    numbers = [phone for phone in phones.values() if phone is not None]
+    if len(numbers) != len(set(numbers)):
+        raise ValueError(u"Duplicate phone numbers: %s"
+                         % duplicates(numbers))
+    for row in rows:
+        if row['type'] not in types:
+            raise ValueError(u"Unknown entity type %(type)s for %(slug)s"
+                             % row)
+        if row.get('parent') and row['parent'] not in slugs:
+            raise ValueError(u"Unknown parent %(parent)s for %(slug)s" % row)
+
+    # number trees by slug: new rows get their MPTT values on insert
+    slug_of = dict((e[1], slug) for slug, e in existing.items())
+    parents = dict((slug, slug_of.get(e[4])) for slug, e in existing.items())
+    placed = {}
+    for index, row in enumerate(rows):
+        parent = row.get('parent') or None
+        if row['slug'] not in existing or parent != parents[row['slug']]:
+            placed[row['slug']] = index
+        parents[row['slug']] = parent
+
+    # only trees receiving or losing entities are renumbered
+    affected = set()
+    for slug in placed:
+        for node in (slug, parents[slug]):
+            if node in existing:
+                affected.add(existing[node][6])
+    nodes = dict((slug, parent) for slug, parent in parents.items()
+                 if slug not in existing or existing[slug][6] in affected)
+    sort_keys = dict((slug, (1, placed[slug]) if slug in placed
+                      else (0, existing[slug][6], existing[slug][7]))
+                     for slug in nodes)
+    tree_ids = dict((slug, existing[slug][6]) for slug, parent in nodes.items()
+                    if parent is None and slug not in placed)
+    numbering = number_trees(nodes, sort_keys, tree_ids,
+                             max([e[6] for e in existing.values()] or [0]) + 1)
+    if len(numbering) != len(nodes):
+        raise ValueError(u"Cycle in parents of %s"
+                         % u", ".join(sorted(set(placed) - set(numbering))))
+
+    # existing ones first: new ones may take their former phone number
+    changes = {}
+    for row in rows:
+        if row['slug'] not in existing:
+            continue
+        slug, eid, name, type_id, current_parent, phone = \
+            existing[row['slug']][:6]
+        values = {'name': row['name'], 'type': types[row['type']],
+                  'phone_number': phone_number(row)}
+        if (name, type_id, phone) != (values['name'], values['type'],
+                                      values['phone_number']):
+            changes[eid] = values
+    # numbers exchanged between entities mustn't collide meanwhile
+    Entity.objects.filter(id__in=[eid for eid, values in changes.items()
+                                  if values['phone_number'] !=
+                                  existing[slug_of[eid]][5]]) \
+                  .exclude(phone_number=None).update(phone_number=None)
+    for eid, values in changes.items():
+        Entity.objects.filter(id=eid).update(**values)
+
+    # parents are set below, once new ones have an id
+    new = []
+    for row in rows:
+        if row['slug'] in existing:
+            continue
+        tree_id, lft, rght, level = numbering[row['slug']]
+        new.append(Entity(slug=row['slug'], name=row['name'],
+                          type_id=types[row['type']],
+                          phone_number=phone_number(row),
+                          tree_id=tree_id, lft=lft, rght=rght, level=level))
+    if not bulk_insert(Entity, new):
+        raise ValueError(u"Entities were created meanwhile. Nothing imported.")
+
+    ids = dict(Entity.objects.values_list('slug', 'id'))
+    moved = 0
+    moves = {}
+    for row in rows:
+        parent_id = ids[row['parent']] if row.get('parent') else None
+        if row['slug'] not in existing:
+            if parent_id is not None:
+                moves.setdefault(parent_id, []).append(ids[row['slug']])
+        elif parent_id != existing[row['slug']][4]:
+            moves.setdefault(parent_id, []).append(ids[row['slug']])
+            moved += 1
+
+    # one UPDATE per new parent
+    for parent_id, children in moves.items():
+        Entity.objects.filter(id__in=children).update(parent=parent_id)
+
+    save_tree_values(dict((existing[slug][1], value)
+                          for slug, value in numbering.items()
+                          if slug in existing),
+                     dict((e[1], e[6:]) for e in existing.values()))
+
+    return Options(created=len(new), updated=len(changes), moved=moved)
+
+
+def reorganize_entities(moves):
+    """ applies many parent changes renumbering only the affected trees
+
+        moves: iterable of (entity, new parent) pairs of Entity or ids.
+        A None parent makes the entity a root.
+
+        Returns Options listing what went stale:
+            moved: ids of entities which parent changed
+            subtrees: ids of moved entities and their descendants
+            ancestors: ids of previous and new ancestors of those
+            providers: ids of Providers with an Access on any of the above
+        Caches keyed on tree_generation() are invalidated already ;
+        entities_moved is sent with the report for the others. """
+    report = _reorganize_entities(moves)
+    if report.moved:
+        bump_tree_generation()
+        entities_moved.send(sender=Entity, report=report)
+    return report
+
+
+@transaction.commit_on_success
+def _reorganize_entities(moves):
+    tree = tree_snapshot.refresh()
+    parents = {}
+    for entity, parent in moves:
+        eid = getattr(entity, 'id', entity)
+        pid = getattr(parent, 'id', parent)
+        if tree.position(eid) is None:
+            raise ValueError(u"Unknown entity %s" % eid)
+        if pid is not None and tree.position(pid) is None:
+            raise ValueError(u"Unknown parent %s" % pid)
+        if pid != tree.parent_id(eid):
+            parents[eid] = pid
+
+    def parent_of(eid):
+        if eid in parents:
+            return parents[eid]
+        return tree.parent_id(eid)
+
+    subtrees = set()
+    ancestors = set()
+    for eid in parents:
+        subtrees.update(tree.descendant_ids(eid, include_self=True))
+        ancestors.update(tree.ancestors(eid))
+        # new ancestors. meeting eid again means a cycle.
+        seen = set([eid])
+        pid = parent_of(eid)
+        while pid is not None:
+            if pid in seen:
+                raise ValueError(u"Entity %s would be its own ancestor" % pid)
+            seen.add(pid)
+            ancestors.add(pid)
+            pid = parent_of(pid)
+    ancestors -= subtrees
+
+    if not parents:
+        return Options(moved=[], subtrees=[], ancestors=[], providers=[])
+
+    # one UPDATE per new parent
+    by_parent = {}
+    for eid, pid in parents.items():
+        by_parent.setdefault(pid, []).append(eid)
+    for pid, children in by_parent.items():
+        Entity.objects.filter(id__in=children).update(parent=pid)
+
+    # renumber trees entities left or joined. others are untouched.
+    affected = set(tree.interval(eid)[0]
+                   for eid in list(parents.keys()) + list(parents.values())
+                   if eid is not None)
+    current = {}
+    nodes = {}
+    for eid, pid, tree_id, lft, rght, level in Entity.objects \
+            .filter(tree_id__in=affected) \
+            .values_list('id', 'parent', 'tree_id', 'lft', 'rght', 'level'):
+        current[eid] = (tree_id, lft, rght, level)
+        nodes[eid] = pid
+    sort_keys = dict((eid, (1, eid) if eid in parents
+                      else (0,) + current[eid][:2]) for eid in nodes)
+    tree_ids = dict((eid, current[eid][0]) for eid, pid in nodes.items()
+                    if pid is None and eid not in parents)
+    next_tree_id = (Entity.objects.aggregate(Max('tree_id'))['tree_id__max']
+                    or 0) + 1
+    save_tree_values(number_trees(nodes, sort_keys, tree_ids, next_tree_id),
+                     current)
+
+    entity_type = ContentType.objects.get_for_model(Entity)
+    providers = Provider.objects.filter(
+        access__content_type=entity_type,
+        access__object_id__in=list(subtrees | ancestors)) \
+        .distinct().values_list('id', flat=True)
+
+    return Options(moved=sorted(parents.keys()), subtrees=sorted(subtrees),
+                   ancestors=sorted(ancestors), providers=list(providers))
+
+
+def normalize_text(text):
+    """ lowercase ascii version of text for searching """
+    text = unicodedata.normalize('NFKD', unicode(text or u''))
+    return text.encode('ascii', 'ignore').lower()
+
+
+def text_words(text):
+    """ normalized words of text """
+    return [word for word in re.split(r'[^a-z0-9]+', normalize_text(text))
+            if word]
+
+
+def is_next_generation(old, new):
+    """ whether new is old plus a single in-process bump """
+    try:
+        old_shared, old_local = old.rsplit(u'.', 1)
+        new_shared, new_local = new.rsplit(u'.', 1)
+        if int(new_local) != int(old_local) + 1:
+            return False
+        return new_shared == old_shared \
+            or int(new_shared) == int(old_shared) + 1
+    except (AttributeError, ValueError):
+        return False
+
+
+class EntitySearchIndex(object):
+    """ in-memory prefix and trigram index of Entities for autocomplete
+
+        Indexes slug, name and parent's name (display_full_name).
+        Entities saved or deleted in this process are reindexed one by one ;
+        other tree changes trigger a full reload on next search.
+
+        search_index.search(u'bamak') => [{'id': 1, 'slug': u'bamako', ..}] """
+
+    MAX_PREFIX = 15
+
+    def __init__(self):
+        self.generation = None
+        self.lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        # entity id -> (slug, name, parent id)
+        self.entries = {}
+        self.children_ids = {}
+        # prefix of any word -> ids
+        self.prefixes = {}
+        self.trigrams = {}
+        # entity id -> (prefixes, trigrams) for removal
+        self.keys = {}
+
+    def refresh(self):
+        """ reloads index if the tree changed elsewhere """
+        generation = tree_generation()
+        if generation == self.generation:
+            return
+        with self.lock:
+            self.reset()
+            for eid, slug, name, parent_id in \
+                    Entity.objects.values_list('id', 'slug', 'name', 'parent'):
+                self.entries[eid] = (slug, name, parent_id)
+                self.children_ids.setdefault(parent_id, set()).add(eid)
+            for eid in self.entries:
+                self._index(eid)
+            self.generation = generation
+
+    def _words(self, eid):
+        slug, name, parent_id = self.entries[eid]
+        parent_name = self.entries.get(parent_id, (None, u''))[1]
+        return text_words(slug) + text_words(name) + text_words(parent_name)
+
+    def _index(self, eid):
+        prefixes = set()
+        trigrams = set()
+        for word in self._words(eid):
+            prefixes.update(word[:i]
+                            for i in range(1, min(len(word),
+                                                  self.MAX_PREFIX) + 1))
+            padded = u' %s ' % word
+            trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+        for prefix in prefixes:
+            self.prefixes.setdefault(prefix, set()).add(eid)
+        for trigram in trigrams:
+            self.trigrams.setdefault(trigram, set()).add(eid)
+        self.keys[eid] = (prefixes, trigrams)
+
+    def _unindex(self, eid):
+        prefixes, trigrams = self.keys.pop(eid, ((), ()))
+        for prefix in prefixes:
+            self.prefixes[prefix].discard(eid)
+        for trigram in trigrams:
+            self.trigrams[trigram].discard(eid)
+
+    def entity_saved(self, entity):
+        self._changed(entity)
+
+    def entity_deleted(self, entity):
+        self._changed(entity, deleted=True)
+
+    def _changed(self, entity, deleted=False):
+        generation = tree_generation()
+        with self.lock:
+            # stale already: a full reload will come on next search
+            if not is_next_generation(self.generation, generation):
+                return
+            eid = entity.id
+            if eid in self.entries:
+                self._unindex(eid)
+                self.children_ids.get(self.entries[eid][2], set()).discard(eid)
+                del self.entries[eid]
+            if not deleted:
+                self.entries[eid] = (entity.slug, entity.name,
+                                     entity.parent_id)
+                self.children_ids.setdefault(entity.parent_id,
+                                             set()).add(eid)
+                self._index(eid)
+            # children's full name includes this entity's name
+            for child_id in self.children_ids.get(eid, ()):
+                if child_id in self.entries:
+                    self._unindex(child_id)
+                    self._index(child_id)
+            self.generation = generation
+
+    def search(self, query, limit=10):
+        """ best matches first: exact slug, then most query words
+            prefixing a slug or name word, then similarity """
+        self.refresh()
+        query = normalize_text(query).strip()
+        words = [word[:self.MAX_PREFIX] for word in text_words(query)]
+        if not words:
+            return []
+
+        with self.lock:
+            # every word prefixing a word of the entity
+            found = set(self.prefixes.get(words[0], ()))
+            for word in words[1:]:
+                found &= self.prefixes.get(word, set())
+
+            def rank(eid):
+                slug, name, parent_id = self.entries[eid]
+                slug_words, name_words = text_words(slug), text_words(name)
+                # per query word: 2 if it prefixes a slug word, 1 a name
+                # word, 0 if it only matched the parent's name
+                score = 0
+                for word in words:
+                    if [w for w in slug_words if w.startswith(word)]:
+                        score += 2
+                    elif [w for w in name_words if w.startswith(word)]:
+                        score += 1
+                return (normalize_text(slug) != query, -score,
+                        len(name), name)
+
+            ranked = sorted(found, key=rank)[:limit]
+
+            # typos: entities sharing most trigrams of the query
+            if len(ranked) < limit:
+                counts = {}
+                trigrams = set()
+                for word in words:
+                    padded = u' %s ' % word
+                    trigrams.update(padded[i:i + 3]
+                                    for i in range(len(padded) - 2))
+                for trigram in trigrams:
+                    for eid in self.trigrams.get(trigram, ()):
+                        if eid not in found:
+                            counts[eid] = counts.get(eid, 0) + 1
+                threshold = max(len(trigrams) // 3, 2)
+                ranked.extend(sorted([eid for eid, count in counts.items()
+                                      if count >= threshold],
+                                     key=lambda eid: (-counts[eid],
+                                                      self.entries[eid][1]))
+                              [:limit - len(ranked)])
+
+            return [self.as_dict(eid) for eid in ranked]
+
+    def as_dict(self, eid):
+        slug, name, parent_id = self.entries[eid]
+        full_name = name.title()
+        if parent_id in self.entries:
+            # same as Entity.display_full_name()
+            full_name = ugettext(u"%(name)s/%(parent)s") \
+                % {'name': full_name,
+                   'parent': self.entries[parent_id][1].title()}
+        return {'id': eid, 'slug': slug, 'name': name,
+                'full_name': full_name}
+
+search_index = EntitySearchIndex()
+
+
+@receiver(post_save, sender=Entity, dispatch_uid='bolibana_search_save')
+def index_saved_entity(sender, instance, **kwargs):
+    search_index.entity_saved(instance)
+
+
+@receiver(post_delete, sender=Entity, dispatch_uid='bolibana_search_delete')
+def unindex_deleted_entity(sender, instance, **kwargs):
+    search_index.entity_deleted(instance)
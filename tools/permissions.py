@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from bisect import bisect_right
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from bolibana.models import Access, Entity
+from bolibana.models.Provider import permissions_version
+from bolibana.tools.entities import tree_snapshot
+
+PERMISSIONS_KEY = 'bolibana_permissions_%d'
+PERMISSIONS_TIMEOUT = getattr(settings, 'BOLIBANA_PERMISSIONS_TIMEOUT', 3600)
+
+
+class ProviderPermissions(object):
+    """ Compiled grants of a Provider
+
+        slugs: every permission slug the provider holds (on any target)
+        intervals: {slug: [(tree_id, lft, rght)]} of Entity targets.
+            Nested intervals are dropped so the remaining ones are
+            disjoint and sorted: a check is a bisect.
+
+        Valid for the tree_snapshot version it was compiled with. """
+
+    def __init__(self, slugs, intervals, generation):
+        self.slugs = slugs
+        self.intervals = intervals
+        self.generation = generation
+        # sort keys of intervals for bisect
+        self.starts = dict((slug, [(tree_id, lft)
+                                   for tree_id, lft, rght in ranges])
+                           for slug, ranges in intervals.items())
+
+    @classmethod
+    def compile(cls, provider):
+        """ single query on accesses & permissions (none if prefetched)
+
+            Targets from snapshot. """
+        entity_type = ContentType.objects.get_for_model(Entity)
+        prefetched = getattr(provider, '_prefetched_objects_cache', {}) \
+            .get('access')
+        if prefetched is not None:
+            # loaded by load_provider(): no query
+            rows = [(permission.slug, access.content_type_id,
+                     access.object_id)
+                    for access in prefetched
+                    for permission in access.role.permissions.all()]
+        else:
+            rows = Access.objects.filter(provider=provider) \
+                                 .values_list('role__permissions',
+                                              'content_type', 'object_id')
+        tree = tree_snapshot.refresh()
+        slugs = set()
+        intervals = {}
+        for slug, content_type, object_id in rows:
+            if slug is None:
+                continue
+            slugs.add(slug)
+            if content_type != entity_type.id:
+                continue
+            interval = tree.interval(object_id)
+            if interval is not None:
+                intervals.setdefault(slug, []).append(interval)
+        return cls(slugs, dict((slug, cls.merge(ranges))
+                               for slug, ranges in intervals.items()),
+                   tree.generation)
+
+    @classmethod
+    def merge(cls, ranges):
+        """ sorted intervals without those included in another """
+        merged = []
+        for tree_id, lft, rght in sorted(set(ranges)):
+            if merged and merged[-1][0] == tree_id and merged[-1][2] >= rght:
+                continue
+            merged.append((tree_id, lft, rght))
+        return merged
+
+    def can(self, permission, entity=None):
+        """ whether permission is granted on entity (or anywhere if None) """
+        if entity is None:
+            return permission in self.slugs
+        return self.covers(permission, tree_snapshot.interval(entity))
+
+    def covers(self, permission, interval):
+        """ whether a (tree_id, lft, rght) is within a granted interval """
+        if interval is None or permission not in self.intervals:
+            return False
+        tree_id, lft, rght = interval
+        index = bisect_right(self.starts[permission], (tree_id, lft)) - 1
+        if index < 0:
+            return False
+        gtree_id, glft, grght = self.intervals[permission][index]
+        return gtree_id == tree_id and rght <= grght
+
+    def entity_filter(self, permission, prefix=''):
+        """ Q restricting Entities to granted subtrees
+
+            prefix targets a relation: entity_filter('can_view', 'entity__') """
+        query = Q(**{prefix + 'pk__in': []})
+        for tree_id, lft, rght in self.intervals.get(permission, []):
+            query |= Q(**{prefix + 'tree_id': tree_id,
+                          prefix + 'lft__range': (lft, rght)})
+        return query
+
+
+def provider_permissions(provider):
+    """ ProviderPermissions of provider
+
+        Kept on the instance (thus for a request) while the tree
+        doesn't change. Shared between requests through cached_permissions() """
+    compiled = getattr(provider, '_compiled_permissions', None)
+    tree_snapshot.refresh()
+    if compiled is None or compiled.generation != tree_snapshot.version:
+        compiled = cached_permissions(provider)
+        provider._compiled_permissions = compiled
+    return compiled
+
+
+def permissions_stamp(provider_id, *keys):
+    """ (stamp, {key: value}) current version of provider's grants
+
+        Extra cache keys are fetched in the same round-trip. """
+    tree_snapshot.refresh()
+    global_version, provider_version, values = permissions_version(
+        provider_id, *keys)
+    # local part of the tree generation differs between processes
+    return ((global_version, provider_version,
+             tree_snapshot.version.rsplit(u'.', 1)[0]), values)
+
+
+def cached_permissions(provider):
+    """ ProviderPermissions from django cache. Compiled if stale
+
+        Entries are stamped with the permissions_version() and shared
+        tree generation read *before* compiling: an entry compiled
+        from data changed meanwhile never matches a later stamp. """
+    key = PERMISSIONS_KEY % provider.id
+    stamp, values = permissions_stamp(provider.id, key)
+    entry = values.get(key)
+    if entry is not None and entry[0] == stamp:
+        return ProviderPermissions(entry[1], entry[2], tree_snapshot.version)
+    compiled = ProviderPermissions.compile(provider)
+    cache.set(key, (stamp, compiled.slugs, compiled.intervals),
+              PERMISSIONS_TIMEOUT)
+    return compiled
+
+
+def permitted_entities(provider, permission, entities):
+    """ entities provider has permission on
+
+        A QuerySet is filtered by the database in a single query.
+        Other iterables of Entity or ids are filtered in memory. """
+    compiled = provider_permissions(provider)
+    if isinstance(entities, QuerySet):
+        return entities.filter(compiled.entity_filter(permission))
+    tree = tree_snapshot.refresh()
+    return [entity for entity in entities
+            if compiled.covers(permission, tree.interval(entity))]
+
+
+def provider_snapshot(provider):
+    """ compact summary of provider to be kept in session
+
+        Stamped like cached_permissions(). see snapshot_is_current() """
+    from bolibana.tools.utils import get_level_for
+
+    stamp, values = permissions_stamp(provider.id)
+    compiled = provider_permissions(provider)
+    access = provider.first_access()
+    target = access.target if access else None
+    try:
+        level = get_level_for(provider)
+    except:
+        level = None
+    return {'stamp': stamp, 'id': provider.id, 'user_id': provider.user_id,
+            'name': provider.name(), 'name_access': provider.name_access(),
+            'level': level,
+            'roles': [access.role_id for access in provider.access.all()],
+            'permissions': list(compiled.slugs),
+            'intervals': compiled.intervals,
+            'target_id': getattr(target, 'id', None),
+            'target': tree_snapshot.interval(target) if target else None}
+
+
+def snapshot_is_current(snapshot):
+    """ whether grants of snapshot's provider didn't change since """
+    return permissions_stamp(snapshot['id'])[0] == snapshot['stamp']
+
+
+def snapshot_permissions(snapshot):
+    """ ProviderPermissions of a current snapshot """
+    return ProviderPermissions(set(snapshot['permissions']),
+                               snapshot['intervals'], tree_snapshot.version)
@@ -189,21 +189,51 @@ def get_autobot():
     return Provider.objects.get(user__username='autobot')
 
 
-def provider_can(permission, provider, entity=None):
-    """ bolean if(not) provider has permission on entity or descendants """
+def load_provider(user):
+    """ Provider of user with accesses, roles, permissions and targets
 
-    for access in provider.access.all():
-        if access.role.permissions.filter(slug=permission).count() > 0:
-            # provider as access. Not entity was queried.
-            if entity is None:
-                return True
+        Four queries. None for anonymous or non-provider users.
+        Further user.get_profile() calls return that same instance. """
+    from django.db.models.query import prefetch_related_objects
+    from bolibana.models import Provider
 
-            # if entity was queried, we need to find out if entity is
-            # within the descendants of provider's one.
-            if entity == access.target \
-               or entity in access.target.get_descendants():
-                return True
-    return False
+    if not user.is_authenticated():
+        return None
+    try:
+        provider = Provider.objects.get(user=user)
+    except Provider.DoesNotExist:
+        return None
+    provider.user = user
+
+    accesses = list(provider.access.select_related('role'))
+    prefetch_related_objects(accesses, ['role__permissions', 'target'])
+    # as prefetch_related('access') would: provider.access.all() is free
+    queryset = provider.access.all()
+    queryset._result_cache = accesses
+    queryset._prefetch_done = True
+    provider._prefetched_objects_cache = {'access': queryset}
+
+    user._profile_cache = provider
+    return provider
+
+
+def request_provider(request):
+    """ Provider of logged-in user or None. See ProviderMiddleware
+
+        May be a lazy object (ProviderSnapshotMiddleware): compare
+        it to None rather than testing its truth value. """
+    if hasattr(request, 'provider'):
+        return request.provider
+    try:
+        return request.user.get_profile()
+    except:
+        return None
+
+
+def provider_can(permission, provider, entity=None):
+    """ bolean if(not) provider has permission on entity or descendants """
+    from bolibana.tools.permissions import provider_permissions
+    return provider_permissions(provider).can(permission, entity)
 
 
 def provider_can_or_403(permission, provider, entity):
@@ -224,14 +254,29 @@ def provider_can_or_403(permission, provider, entity):
 
 def entities_path(root, entity):
     """ [] or {} for multi-select containing path to root entity """
+    # module-level import runs within bolibana.models' own import
+    from bolibana.models import Entity
+
+    # children of entity and of each of its ancestors in a single query
+    children = {}
+    ancestors = {}
+    for child in Entity.objects.filter(tree_id=entity.tree_id,
+                                       parent__lft__lte=entity.lft,
+                                       parent__rght__gte=entity.rght) \
+                               .order_by('name'):
+        children.setdefault(child.parent_id, []).append((child.slug, child))
+        if child.lft <= entity.lft and child.rght >= entity.rght:
+            ancestors[child.id] = child
+
     paths = []
-    if entity.get_children():
-        p = {'selected': None, 'elems': entity_children(entity)}
+    if children.get(entity.id):
+        p = {'selected': None, 'elems': children[entity.id]}
         paths.append(p)
-    while entity.parent and not entity == root:
-        p = {'selected': entity.slug, 'elems': entity_children(entity.parent)}
+    while entity is not None and entity.parent_id and not entity == root:
+        p = {'selected': entity.slug, 'elems': children[entity.parent_id]}
         paths.append(p)
-        entity = entity.parent
+        # top-level entities are nobody's child thus not fetched.
+        entity = ancestors.get(entity.parent_id)
     paths.reverse()
     return paths
 
@@ -246,13 +291,16 @@ def get_level_for(provider):
     # finds best access
     # based on number of descendants
     # in the entities hierarchy
+    from bolibana.tools.entities import tree_snapshot
+
     best_access = provider.first_access() or \
         Access.objects.get(role=Role.objects.get(slug='guest'),
                            object_id=1,
                            content_type=ContentType.objects.get(app_label='bolibana_reporting',
                                                                 model='entity'))
 
-    return best_access.target.type.slug
+    target = best_access.target
+    return tree_snapshot.type_slug(target) or target.type.slug
 
 
 def random_proverb():
@@ -276,7 +324,7 @@ def generate_receipt(instance, fix='', add_random=False, format=None):
             X: Random 0-9 number (optionnal) """
 
         import random
-        from bolibana.models import EntityType
+        from bolibana.tools.entities import ancestor_index
 
         if add_random:
             rand_part = random.randint(0, 9).__str__()
@@ -288,19 +336,15 @@ def generate_receipt(instance, fix='', add_random=False, format=None):
                      '-%(day)s-%(dow)s%(fix)s%(rand)s'
 
         DOW = ['D', 'L', 'M', 'E', 'J', 'V', 'S']
-        try:
-            region_type = EntityType.objects.get(slug='region')
-        except:
-            region_type = None
 
         def region_id(slug):
             return slug.upper()[0:2]
 
         region = 'ML'
-        for ent in instance.entity.get_ancestors().reverse():
-            if ent.type == region_type:
-                region = region_id(ent.slug)
-                break
+        region_entity = ancestor_index.ancestor(instance.entity, 'region',
+                                                include_self=False)
+        if region_entity is not None:
+            region = region_id(region_entity.slug)
 
         value_dict = {'day': instance.created_on.strftime('%j'),
                       'dow': DOW[int(instance.created_on.strftime('%w'))],
@@ -4,24 +4,26 @@
 
 from django.conf import settings
 
-from bolibana.tools.utils import get_level_for, random_proverb
+from bolibana.tools.utils import (get_level_for, random_proverb,
+                                  request_provider)
 
 
 def add_provider(request):
     """ Add the provider object of logged-in user or None """
-    try:
-        web_provider = request.user.get_profile()
-    except:
-        web_provider = None
+    web_provider = request_provider(request)
 
     fortune = random_proverb() if settings.ENABLE_FORTUNE else None
-    return {'web_provider': web_provider, 'fortune': fortune}
+    return {'web_provider': web_provider, 'fortune': fortune,
+            'provider_snapshot': getattr(request, 'provider_snapshot', None)}
 
 
 def add_level(request):
     """ Add level (hierachy slug) of logged-in provider or None """
+    snapshot = getattr(request, 'provider_snapshot', None)
+    if snapshot is not None:
+        return {'level': snapshot['level']}
     try:
-        level = get_level_for(request.user.get_profile())
+        level = get_level_for(request_provider(request))
     except:
         level = None
     return {'level': level}
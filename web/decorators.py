@@ -7,18 +7,16 @@ from django.shortcuts import redirect
 from django.utils.translation import ugettext as _
 
 from bolibana.web.http import Http403
-from bolibana.tools.utils import provider_can_or_403
+from bolibana.tools.utils import provider_can_or_403, request_provider
 
 
 def provider_required(target):
     """ Web view decorator ensuring visitor is a logged-in Provider """
     def wrapper(request, *args, **kwargs):
-        try:
-            web_provider = request.user.get_profile()
-        except:
-            # either not logged-in or non-provider user
-            web_provider = None
-        if web_provider:
+        # None if either not logged-in or non-provider user
+        web_provider = request_provider(request)
+        # not truth testing: that would load a lazy provider
+        if web_provider is not None:
             # user is a provider, forward to view
             return target(request, *args, **kwargs)
         else:
@@ -38,10 +36,8 @@ def provider_permission(permission, entity=None):
     """ Web views decorator checking for premission on entity """
     def decorator(target):
         def wrapper(request, *args, **kwargs):
-            try:
-                web_provider = request.user.get_profile()
-                assert(web_provider)
-            except:
+            web_provider = request_provider(request)
+            if web_provider is None:
                 # user is not a provider. could be logged-in though.
                 # forwards to provider_required
                 return provider_required(target)(request, *args, **kwargs)
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# encoding=utf-8
+# maintainer: rgaudin
+
+from django.forms.fields import ChoiceField
+from django.forms.models import ModelChoiceIterator
+from django.forms.widgets import Select
+from django.utils.encoding import force_unicode
+from django.utils.translation import get_language
+from mptt.fields import TreeNodeChoiceField
+
+from bolibana.models.Entity import tree_generation
+from bolibana.tools.caching import LRUCache
+
+# (tree generation, query, labels) -> {'choices': [], 'options': []}
+entity_choices_cache = LRUCache(maxsize=50)
+
+
+class EntityChoices(object):
+    """ lazy choices of an EntityChoiceField
+
+        Built once per tree generation and shared by all forms using
+        the same queryset. Nothing is queried until iterated. """
+
+    def __init__(self, field):
+        self.field = field
+
+    def entry(self):
+        field = self.field
+        key = (tree_generation(), unicode(field.queryset.query),
+               field.level_indicator, get_language(),
+               None if field.empty_label is None
+               else force_unicode(field.empty_label))
+        entry = entity_choices_cache.get(key)
+        if entry is None:
+            entry = {'choices': list(ModelChoiceIterator(field)),
+                     'options': None}
+            entity_choices_cache.set(key, entry)
+        return entry
+
+    def __iter__(self):
+        return iter(self.entry()['choices'])
+
+    def __len__(self):
+        return len(self.entry()['choices'])
+
+
+class EntitySelect(Select):
+    """ Select reusing the cached <option> list of EntityChoices
+
+        Only selected options are rendered again. """
+
+    def render_options(self, choices, selected_choices):
+        if choices or not isinstance(self.choices, EntityChoices):
+            return super(EntitySelect, self).render_options(choices,
+                                                            selected_choices)
+        entry = self.choices.entry()
+        if entry['options'] is None:
+            entry['options'] = [self.render_option(set(), value, label)
+                                for value, label in entry['choices']]
+        selected = set(force_unicode(value) for value in selected_choices)
+        output = []
+        for (value, label), option in zip(entry['choices'],
+                                          entry['options']):
+            if force_unicode(value) in selected:
+                option = self.render_option(selected, value, label)
+            output.append(option)
+        return u'\n'.join(output)
+
+
+class EntityChoiceField(TreeNodeChoiceField):
+    """ TreeNodeChoiceField for Entities caching choices and rendered options
+
+        Cache is keyed on tree_generation() thus refreshed on any
+        Entity save, delete or move. """
+
+    widget = EntitySelect
+
+    def _get_choices(self):
+        if hasattr(self, '_choices'):
+            return self._choices
+        return EntityChoices(self)
+
+    choices = property(_get_choices, ChoiceField._set_choices)
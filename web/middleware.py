@@ -4,10 +4,18 @@
 
 from django.template import RequestContext, loader
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 from django.http import HttpResponseForbidden, HttpResponseNotFound
 from django.views.decorators.csrf import requires_csrf_token
 from django.http import Http404
 from bolibana.web.http import Http403
+from bolibana.models.Entity import pinned_tree_generation
+from bolibana.tools.utils import load_provider
+from bolibana.tools.permissions import (provider_snapshot,
+                                        snapshot_is_current,
+                                        snapshot_permissions)
+
+SNAPSHOT_SESSION_KEY = 'bolibana_provider'
 
 
 @requires_csrf_token
@@ -83,3 +91,67 @@ class Http500Middleware(object):
             # that likely to happen.
             return access_error(request, u"Unknown")
         return response
+
+
+class EntityTreeMiddleware(object):
+    """ reads the Entity tree generation once per request
+
+        tree_snapshot, ancestor_index, entity choices and permission
+        checks would otherwise query the cache on each lookup (e.g. the
+        region filter on every row). Changes made by other processes
+        are seen on next request ; those made by this one right away.
+        Put it first. """
+    def process_request(self, request):
+        # starts clean even if a previous request never got a response
+        pinned_tree_generation.reset()
+        pinned_tree_generation.pin()
+
+    def process_response(self, request, response):
+        pinned_tree_generation.reset()
+        return response
+
+
+class ProviderMiddleware(object):
+    """ loads logged-in user's Provider once for the whole request
+
+        request.provider is None or the Provider with its accesses, roles,
+        permissions and targets prefetched. Decorators, context processors
+        and request.user.get_profile() all use it.
+        Must come after AuthenticationMiddleware. """
+    def process_request(self, request):
+        request.provider = load_provider(request.user)
+
+
+class ProviderSnapshotMiddleware(object):
+    """ ProviderMiddleware skipping Provider/Access queries while unchanged
+
+        Keeps a provider_snapshot() in session, used as long as its
+        stamp is current. request.provider is then a lazy Provider
+        loaded only if a view actually uses it ; permission checks
+        and request.provider_snapshot need no query. Deleting the
+        Provider outdates the stamp: request.provider is then None.
+        Use instead of ProviderMiddleware, after SessionMiddleware. """
+    def process_request(self, request):
+        request.provider_snapshot = None
+        if not request.user.is_authenticated():
+            request.provider = None
+            return
+
+        snapshot = request.session.get(SNAPSHOT_SESSION_KEY)
+        if snapshot is not None \
+           and snapshot['user_id'] == request.user.id \
+           and snapshot_is_current(snapshot):
+            provider = SimpleLazyObject(lambda: load_provider(request.user))
+            # permission checks won't trigger loading
+            provider.__dict__['_compiled_permissions'] = \
+                snapshot_permissions(snapshot)
+            request.user._profile_cache = provider
+        else:
+            provider = load_provider(request.user)
+            snapshot = provider_snapshot(provider) if provider else None
+            if snapshot is None:
+                request.session.pop(SNAPSHOT_SESSION_KEY, None)
+            else:
+                request.session[SNAPSHOT_SESSION_KEY] = snapshot
+        request.provider = provider
+        request.provider_snapshot = snapshot
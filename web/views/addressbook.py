@@ -7,10 +7,10 @@ from django.shortcuts import render, redirect
 from django.utils.translation import ugettext as _, ugettext_lazy
 from django import forms
 
-from mptt.fields import TreeNodeChoiceField
-
 from bolibana.models import Role, Provider, Entity
 from bolibana.web.decorators import provider_permission
+from bolibana.web.fields import EntityChoiceField
+from bolibana.tools.entities import tree_snapshot
 
 from nosmsd.utils import send_sms
 
@@ -21,9 +21,9 @@ class AddressBookForm(forms.Form):
                              choices=[('', _(u"All"))] + [(role.slug, role.name)
                                                           for role in Role.objects.all()
                                                                           .order_by('name')])
-    entity = TreeNodeChoiceField(queryset=Entity.tree.all(),
-                                 level_indicator=u'---',
-                                 label=ugettext_lazy(u"Entity"))
+    entity = EntityChoiceField(queryset=Entity.tree.all(),
+                               level_indicator=u'---',
+                               label=ugettext_lazy(u"Entity"))
 
 
 class MessageForm(forms.Form):
@@ -49,8 +49,8 @@ def addressbook(request, template='addressbook.html'):
 
         if request.POST.get('entity'):
             entity = Entity.objects.get(id=request.POST.get('entity'))
-            providers = providers.filter(access__object_id__in=[entity.id]
-                                         + [e.id for e in entity.get_descendants()],
+            providers = providers.filter(access__object_id__in=tree_snapshot
+                                         .descendant_ids(entity, include_self=True),
                                          user__is_active=True)
 
         context.update({'contacts': providers})
@@ -81,8 +81,8 @@ def adressbook_send_sms(request):
 
         if entity_id:
             entity = Entity.objects.get(id=entity_id)
-            providers = providers.filter(access__object_id__in=[entity.id]
-                                         + [e.id for e in entity.get_descendants()],
+            providers = providers.filter(access__object_id__in=tree_snapshot
+                                         .descendant_ids(entity, include_self=True),
                                          user__is_active=True)
 
         is_everything = not role_slug and entity_id == 1
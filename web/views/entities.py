@@ -2,10 +2,12 @@
 # encoding=utf-8
 # maintainer: rgaudin
 
+import json
 import logging
 
 from django.forms import ModelForm
 from django.contrib import messages
+from django.http import HttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.utils.translation import ugettext as _
 from django.views.generic import ListView
@@ -14,7 +16,8 @@ from bolibana.models.Entity import Entity
 from bolibana.models.ScheduledReporting import ScheduledReporting
 from bolibana.models.ReportClass import ReportClass
 from bolibana.models.ExpectedReporting import SOURCE_LEVEL
-from bolibana.web.decorators import provider_permission
+from bolibana.web.decorators import provider_permission, provider_required
+from bolibana.tools.entities import search_index
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +39,17 @@ class EntitiesListView(ListView):
         return context
 
 
+@provider_required
+def entities_autocomplete(request):
+    """ JSON list of Entities matching ?q= best first """
+    try:
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    results = search_index.search(request.GET.get('q', u''), limit)
+    return HttpResponse(json.dumps(results), content_type='application/json')
+
+
 class AddEntityForm(ModelForm):
 
     class Meta:
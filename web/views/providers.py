@@ -10,7 +10,6 @@ from django.contrib import messages
 from django.shortcuts import render, redirect
 from django.utils.translation import ugettext as _, ugettext_lazy
 from django.views.generic import ListView
-from mptt.fields import TreeNodeChoiceField
 
 from bolibana.models import Role, Provider, Access
 from bolibana.auth.utils import (username_from_name, random_password,
@@ -18,6 +17,7 @@ from bolibana.auth.utils import (username_from_name, random_password,
 from bolibana.models import Entity
 from bolibana.tools.utils import send_email, full_url, clean_phone_number
 from bolibana.web.decorators import provider_permission
+from bolibana.web.fields import EntityChoiceField
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +29,8 @@ class ProvidersListView(ListView):
     template_name = 'users_list.html'
 
     def get_queryset(self):
-        return Provider.objects.order_by('user__first_name', 'user__last_name')
+        return Provider.objects.with_accesses() \
+                               .order_by('user__first_name', 'user__last_name')
 
     def get_context_data(self, **kwargs):
         context = super(ProvidersListView, self).get_context_data(**kwargs)
@@ -61,9 +62,9 @@ class EditProviderForm(forms.Form):
                                       for role
                                       in Role.objects.all().order_by('name')])
 
-    entity = TreeNodeChoiceField(queryset=Entity.tree.all(),
-                                 level_indicator=u'---',
-                                 label=ugettext_lazy(u"Entity"))
+    entity = EntityChoiceField(queryset=Entity.tree.all(),
+                               level_indicator=u'---',
+                               label=ugettext_lazy(u"Entity"))
 
     def clean_phone_number(self):
         ind, clean_num = clean_phone_number(self.cleaned_data